@@ -0,0 +1,142 @@
+# Static asset pipeline: content-hashed copies of every file under static/ plus gzip
+# variants of the text assets, served with far-future caching headers.
+#
+# `flask --app main build-assets` writes static/dist/<path>.<hash>.<ext> and
+# static/dist/manifest.json. Templates keep calling url_for("static", filename=...), which
+# resolves to the hashed copy when a manifest exists and to the original file otherwise.
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Assets worth precompressing; images and fonts are already compressed.
+TEXT_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".map"}
+
+# Relative url(...) references in CSS, rewritten to the hashed copies they point to.
+CSS_URL = re.compile(r"""url\(\s*(['"]?)(?!data:|https?:|//|/)([^'")?#]+)([^'")]*)\1\s*\)""")
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(path: str, digest: str) -> str:
+    """css/chapters.css -> css/chapters.<digest>.css"""
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def _source_files(static_folder: str) -> list:
+    """Paths (relative, with forward slashes) of every asset outside the dist directory."""
+    paths = []
+    for directory, subdirectories, files in os.walk(static_folder):
+        relative_directory = os.path.relpath(directory, static_folder)
+        if relative_directory == ".":
+            subdirectories[:] = [name for name in subdirectories if name != DIST_DIR]
+        for name in files:
+            path = os.path.normpath(os.path.join(relative_directory, name))
+            paths.append(path.replace(os.sep, "/"))
+    # CSS last, so the files it references already have their hashed names
+    return sorted(paths, key=lambda path: (path.endswith(".css"), path))
+
+
+def _rewrite_css(css: str, path: str, manifest: dict) -> str:
+    """Points the relative url(...) references of a stylesheet at the hashed copies."""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, reference, suffix = match.groups()
+        target = posixpath.normpath(posixpath.join(directory, reference))
+        if target not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[target], directory or ".")
+        return f"url({quote}{hashed}{suffix}{quote})"
+
+    return CSS_URL.sub(replace, css)
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def build(static_folder: str, compress_level=9, log=print) -> dict:
+    """
+    Writes the hashed copy (and gzip variant, for text assets) of every static file and the
+    manifest mapping original paths to hashed ones. Files from earlier builds are kept, so
+    pages rendered by workers still running the previous manifest keep working.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for path in _source_files(static_folder):
+        with open(os.path.join(static_folder, path), "rb") as file:
+            data = file.read()
+        if path.endswith(".css"):
+            data = _rewrite_css(data.decode("utf-8"), path, manifest).encode("utf-8")
+
+        hashed = hashed_name(path, fingerprint(data))
+        manifest[path] = hashed
+        target = os.path.join(dist, hashed)
+        if os.path.exists(target):
+            continue
+        _write(target, data)
+        if posixpath.splitext(path)[1].lower() in TEXT_EXTENSIONS:
+            _write(target + ".gz", gzip.compress(data, compresslevel=compress_level, mtime=0))
+        log(f"  {path} -> {DIST_DIR}/{hashed}")
+
+    _write(
+        os.path.join(dist, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return manifest
+
+
+class Assets:
+    """
+    The manifest of the last asset build, loaded at startup. Without a manifest every
+    asset is served from its original path, so development needs no build step.
+    `version` is a digest of the manifest.
+    """
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self._urls = {}
+        self._fingerprinted = set()
+        self.version = None
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.static_folder, DIST_DIR, MANIFEST_NAME)
+        try:
+            with open(path, encoding="utf-8") as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            manifest = {}
+        self._urls = {source: f"{DIST_DIR}/{hashed}" for source, hashed in manifest.items()}
+        self.version = fingerprint(json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        self._fingerprinted = set(self._urls.values())
+
+    def url(self, filename: str) -> str:
+        """Returns the path to serve a static file from: its hashed copy if there is one."""
+        return self._urls.get(filename, filename)
+
+    def is_fingerprinted(self, filename: str) -> bool:
+        """Tells whether a requested static path is a hashed copy, whose content never changes."""
+        return filename in self._fingerprinted
+
+    def gzip_variant(self, filename: str):
+        """Returns the path of the precompressed variant of a hashed copy, or None."""
+        if posixpath.splitext(filename)[1].lower() not in TEXT_EXTENSIONS:
+            return None
+        variant = filename + ".gz"
+        if os.path.isfile(os.path.join(self.static_folder, variant)):
+            return variant
+        return None
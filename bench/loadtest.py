@@ -0,0 +1,455 @@
+"""
+Load test: concurrent students walking the real flow while teachers browse the roster.
+
+Each student signs up, logs in, opens /chapters, takes the level test, reads the first
+chapter, takes its test (N x /rightanswer, then /gradetest) and opens /profile. Each
+teacher pages through /students until the students are done. The app is started with
+gunicorn.conf.py on a free local port, against either a local MySQL database loaded from
+pythonista.sql (--database mysql, DB_* variables as for the app) or the SQLite stand-in
+of the test suite, created from pythonista.sql for the run (--database standin).
+
+    python bench/loadtest.py --students 50 --teachers 2 --save baseline
+    python bench/loadtest.py --students 50 --teachers 2 --compare baseline
+
+Reports throughput, errors and p50/p95/p99 latency per endpoint. A request fails on an HTTP
+error, a JSON body with an error key or a redirect to /login; a student whose sign-up or
+login fails stops there. --save writes the results to bench/baselines/<name>.json;
+--compare exits with status 1 when an endpoint's p95 or the overall throughput is worse than
+the baseline by more than --tolerance, or when the error rate is higher than the baseline's.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+DUMP_PATH = os.path.join(ROOT_DIR, "pythonista.sql")
+
+QUESTION_ID = re.compile(r'display: none;">(\d+)<')
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """Latencies (seconds) and error counts per endpoint label, shared by every virtual user."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, label, elapsed, ok):
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            if not ok:
+                self.errors[label] += 1
+
+
+def reports_error(response, data):
+    """
+    Tells whether a response reports a failure although its status does not: the app answers
+    most errors with a 200 JSON body, and pages needing a session redirect to /login.
+    """
+    if response.status in (301, 302, 303, 307, 308):
+        return urlsplit(response.getheader("Location") or "").path.rstrip("/") == "/login"
+    if not (response.getheader("Content-Type") or "").startswith("application/json"):
+        return False
+    try:
+        body = json.loads(data)
+    except ValueError:
+        return True
+    return isinstance(body, dict) and "error" in body
+
+
+class Client:
+    """One virtual user: a keep-alive connection to the app and its session cookie."""
+
+    def __init__(self, port, recorder):
+        self.port = port
+        self.recorder = recorder
+        self.cookies = SimpleCookie()
+        self._connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method, path, label, form=None, json_body=None):
+        """Sends a request and records its latency under label. Returns (ok, body)."""
+        headers = {"Accept-Encoding": "gzip"}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())
+
+        started = time.perf_counter()
+        try:
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(label, time.perf_counter() - started, ok=False)
+            self._connection.close()
+            return False, b""
+        elapsed = time.perf_counter() - started
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(header)
+        if response.getheader("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        ok = response.status < 400 and not reports_error(response, data)
+        self.recorder.record(label, elapsed, ok=ok)
+        return ok, data
+
+    def close(self):
+        self._connection.close()
+
+
+def sign_up(client, name):
+    """Creates the account and returns its email, or None when the sign-up failed."""
+    email = f"{name}@example.com"
+    ok, _ = client.request(
+        "POST", "/signup", "POST /signup", form={"username": name, "email": email, "password": "pw", "age": "20"}
+    )
+    return email if ok else None
+
+
+def log_in(client, email):
+    """Logs in and tells whether it worked."""
+    ok, _ = client.request("POST", "/login", "POST /login", form={"email": email, "password": "pw"})
+    return ok
+
+
+def served_questions(body):
+    return QUESTION_ID.findall(body.decode("utf-8", "replace"))
+
+
+def student_session(port, recorder, name, questions, answer_key):
+    """One student's first visit, from sign-up to a passed chapter test."""
+    client = Client(port, recorder)
+    try:
+        # Without an account or a session every later page would only redirect to /login
+        email = sign_up(client, name)
+        if email is None or not log_in(client, email):
+            return
+        client.request("GET", "/chapters", "GET /chapters")
+
+        # The level test, answered wrongly: the student is placed as a beginner
+        _, body = client.request("GET", "/tests?test=levels", "GET /tests")
+        answers = {question_id: "a" for question_id in served_questions(body)}
+        client.request("POST", "/gradetest", "POST /gradetest", json_body={"test": "levels", "answers": answers})
+
+        client.request("POST", "/chapters", "POST /chapters", form={"chapter": "Quickstart"})
+        client.request("GET", "/chapters/Quickstart/content", "GET /chapters/<chapter>/content")
+
+        # The chapter test, answered from the answer key so the student passes it
+        _, body = client.request("GET", "/tests?test=Quickstart_test", "GET /tests")
+        answers = {question_id: answer_key.get(question_id, "a") for question_id in served_questions(body)}
+        for question_id in list(answers)[:questions]:
+            client.request(
+                "POST",
+                "/rightanswer",
+                "POST /rightanswer",
+                form={"question": question_id, "answer": answers[question_id], "test": "Quickstart_test"},
+            )
+        client.request(
+            "POST", "/gradetest", "POST /gradetest", json_body={"test": "Quickstart_test", "answers": answers}
+        )
+        client.request("GET", "/profile", "GET /profile")
+    finally:
+        client.close()
+
+
+def teacher_session(port, recorder, email, done):
+    """A teacher browsing the roster, sorted two ways, until the students are done."""
+    client = Client(port, recorder)
+    try:
+        if not log_in(client, email):
+            return
+        while not done.is_set():
+            client.request("GET", "/students", "GET /students")
+            client.request("GET", "/students?sort=average&order=desc", "GET /students")
+    finally:
+        client.close()
+
+
+def connect_database(database, standin_path):
+    """A DB-API connection to the database the app runs on, and its parameter placeholder."""
+    if database == "standin":
+        return sqlite3.connect(standin_path), "?"
+
+    import pymysql
+
+    connection = pymysql.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USERNAME"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME", "pythonista"),
+    )
+    return connection, "%s"
+
+
+def promote_teachers(database, standin_path, names):
+    """Gives the named accounts teacher access, directly in the database."""
+    connection, placeholder = connect_database(database, standin_path)
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            f"UPDATE users_info SET teacher = 1 WHERE username = {placeholder}", [(name,) for name in names]
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def load_answer_key(database, standin_path):
+    """The right answer of every chapter-test question, by question id as served in the page."""
+    connection, _ = connect_database(database, standin_path)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT test_id, right_answer FROM tests_questions")
+        return {str(test_id): answer for test_id, answer in cursor.fetchall()}
+    finally:
+        connection.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(args, port, standin_path):
+    """Starts the app under gunicorn with the production config and waits until it answers."""
+    env = dict(
+        os.environ,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_ACCESS_LOG=os.devnull,
+        GUNICORN_MAX_REQUESTS="0",
+    )
+    env.setdefault("SECRET_KEY", uuid.uuid4().hex)
+    app_module = "wsgi:app"
+    if standin_path:
+        env["BENCH_STANDIN_DB"] = standin_path
+        app_module = "bench.standin_wsgi:app"
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", app_module], cwd=ROOT_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("The app exited during startup.")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                connection.close()
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("The app did not start within 60 seconds.")
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(recorder, wall_time):
+    endpoints = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        endpoints[label] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[label],
+            "throughput": round(len(latencies) / wall_time, 2),
+            **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) for p in PERCENTILES},
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "requests": total,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "seconds": round(wall_time, 2),
+        "throughput": round(total / wall_time, 2),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(results):
+    print(f"\n{'endpoint':<34}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, endpoint in results["endpoints"].items():
+        print(
+            f"{label:<34}{endpoint['requests']:>9}{endpoint['errors']:>8}{endpoint['throughput']:>9}"
+            f"{endpoint['p50_ms']:>9}{endpoint['p95_ms']:>9}{endpoint['p99_ms']:>9}"
+        )
+    print(
+        f"\n{results['requests']} requests, {results['errors']} errors in {results['seconds']} s: "
+        f"{results['throughput']} requests/s"
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change from a baseline and returns the regressions found."""
+    regressions = []
+    print(f"\nCompared with the baseline from {baseline['created']} (commit {baseline.get('commit')}):")
+    for label, endpoint in results["endpoints"].items():
+        before = baseline["endpoints"].get(label)
+        if not before:
+            continue
+        change = (endpoint["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        print(f"  {label:<34} p95 {before['p95_ms']:>8} -> {endpoint['p95_ms']:>8} ms ({change:+.0%})")
+        if change > tolerance:
+            regressions.append(f"{label} p95 is {change:.0%} slower")
+
+    before = baseline["throughput"]
+    change = (results["throughput"] - before) / before if before else 0
+    print(f"  {'throughput':<34}     {before:>8} -> {results['throughput']:>8} req/s ({change:+.0%})")
+    if change < -tolerance:
+        regressions.append(f"throughput is {-change:.0%} lower")
+
+    before = error_rate(baseline)
+    after = error_rate(results)
+    print(f"  {'error rate':<34}     {before:>8.2%} -> {after:>8.2%}")
+    if after > before:
+        regressions.append(f"error rate rose from {before:.2%} to {after:.2%}")
+    return regressions
+
+
+def error_rate(results):
+    return results["errors"] / results["requests"] if results["requests"] else 0.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", choices=["standin", "mysql"], default="standin")
+    parser.add_argument("--students", type=int, default=20, help="concurrent students")
+    parser.add_argument("--teachers", type=int, default=2, help="concurrent teachers")
+    parser.add_argument("--questions", type=int, default=3, help="/rightanswer calls per chapter test")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="threads per gunicorn worker")
+    parser.add_argument("--save", metavar="NAME", help="save the results as bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with bench/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    run = uuid.uuid4().hex[:8]
+    standin_dir = standin_path = None
+    if args.database == "standin":
+        sys.path.insert(0, os.path.join(ROOT_DIR, "tests"))
+        import mysql_standin
+
+        standin_dir = tempfile.mkdtemp(prefix="pythonista-bench-")
+        standin_path = os.path.join(standin_dir, "pythonista.sqlite3")
+        mysql_standin.create_database(standin_path, DUMP_PATH)
+
+    port = free_port()
+    server = None
+    try:
+        server = start_app(args, port, standin_path)
+
+        # Teacher accounts are set up before the clock starts
+        setup = Recorder()
+        teachers = [f"teacher{run}{number}" for number in range(args.teachers)]
+        emails = []
+        for name in teachers:
+            client = Client(port, setup)
+            email = sign_up(client, name)
+            client.close()
+            if email is None:
+                raise SystemExit(f"Could not create the teacher account {name}.")
+            emails.append(email)
+        if teachers:
+            promote_teachers(args.database, standin_path, teachers)
+        answer_key = load_answer_key(args.database, standin_path)
+
+        recorder = Recorder()
+        done = threading.Event()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.students + args.teachers) as executor:
+            teacher_futures = [executor.submit(teacher_session, port, recorder, email, done) for email in emails]
+            student_futures = [
+                executor.submit(
+                    student_session, port, recorder, f"student{run}{number}", args.questions, answer_key
+                )
+                for number in range(args.students)
+            ]
+            try:
+                for future in student_futures:
+                    future.result()
+            finally:
+                done.set()
+            for future in teacher_futures:
+                future.result()
+        wall_time = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if standin_dir:
+            shutil.rmtree(standin_dir, ignore_errors=True)
+
+    results = summarize(recorder, wall_time)
+    print_report(results)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "commit": git_commit(),
+                    "settings": vars(args),
+                    **results,
+                },
+                file,
+                indent=2,
+            )
+        print(f"Saved the baseline to {os.path.relpath(path, ROOT_DIR)}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
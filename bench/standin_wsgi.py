@@ -0,0 +1,14 @@
+# WSGI entry point for load tests without a MySQL server: the app running on the SQLite
+# stand-in the test suite uses. loadtest.py creates the database and sets BENCH_STANDIN_DB.
+import os
+import sys
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+import main  # noqa: E402
+import mysql_standin  # noqa: E402
+
+main.db_pool._connect = partial(mysql_standin.connect, os.environ["BENCH_STANDIN_DB"])
+
+app = main.create_app()
@@ -0,0 +1,100 @@
+# In-process cache of the curriculum tables (chapters and tests), which almost never change.
+import hashlib
+import threading
+import time
+
+CHAPTERS_QUERY = "SELECT id, chapter_name FROM chapters ORDER BY id"
+TESTS_QUERY = "SELECT id, test_name FROM tests ORDER BY id"
+
+# Naming convention of the chapters table: each curriculum section is closed by an evaluation
+# chapter whose name ends with this suffix (BasicsTest, AdvancedTest, ExpertTest), and no other
+# chapter name may end with it. Level placement grants whole sections up to these chapters.
+SECTION_END_SUFFIX = "Test"
+# Naming convention of the tests table: a chapter's test is named after it (Chapter1_test), so
+# the tests closing each section are the ones ending with SECTION_END_SUFFIX + TEST_NAME_SUFFIX.
+TEST_NAME_SUFFIX = "_test"
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the chapters and tests tables at one point in time.
+
+    chapters / tests: names ordered by id.
+    chapter_ids / test_ids: name -> id.
+    chapter_names / test_names: id -> name.
+    section_ends: ids of the evaluation chapters (named ...SECTION_END_SUFFIX) closing each section.
+    test_section_ends: ids of their tests (named ...SECTION_END_SUFFIX + TEST_NAME_SUFFIX).
+    sections: number of curriculum sections closed in both tables.
+    version: digest of both tables' contents, identical in every worker that loaded the same rows.
+    """
+
+    def __init__(self, chapter_rows, test_rows, loaded_at):
+        self.chapters = tuple(name for _, name in chapter_rows)
+        self.tests = tuple(name for _, name in test_rows)
+        self.chapter_ids = {name: id_ for id_, name in chapter_rows}
+        self.test_ids = {name: id_ for id_, name in test_rows}
+        self.chapter_names = {id_: name for id_, name in chapter_rows}
+        self.test_names = {id_: name for id_, name in test_rows}
+        self.section_ends = tuple(id_ for id_, name in chapter_rows if name.endswith(SECTION_END_SUFFIX))
+        self.test_section_ends = tuple(
+            id_ for id_, name in test_rows if name.endswith(SECTION_END_SUFFIX + TEST_NAME_SUFFIX)
+        )
+        self.sections = min(len(self.section_ends), len(self.test_section_ends))
+        self.version = hashlib.sha256(
+            repr((tuple(map(tuple, chapter_rows)), tuple(map(tuple, test_rows)))).encode()
+        ).hexdigest()[:16]
+        self.loaded_at = loaded_at
+
+    def through_section(self, count):
+        """
+        Returns the (chapters, tests) names of the first count sections, in curriculum order.
+        Each table is cut at its own section end, so chapter and test ids need not match.
+        """
+        last_chapter = self.section_ends[count - 1]
+        last_test = self.test_section_ends[count - 1]
+        return (
+            [name for name in self.chapters if self.chapter_ids[name] <= last_chapter],
+            [name for name in self.tests if self.test_ids[name] <= last_test],
+        )
+
+
+class Catalog:
+    """
+    Loads both curriculum tables with a single connection and serves them from memory
+    until the TTL expires or invalidate() is called.
+    """
+
+    def __init__(self, pool, ttl=600):
+        self._pool = pool
+        self.ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _expired(self, snapshot):
+        return snapshot is None or time.monotonic() - snapshot.loaded_at > self.ttl
+
+    def _load(self):
+        with self._pool.connect() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(CHAPTERS_QUERY)
+                chapter_rows = cursor.fetchall()
+                cursor.execute(TESTS_QUERY)
+                test_rows = cursor.fetchall()
+        return CatalogSnapshot(chapter_rows, test_rows, time.monotonic())
+
+    def get(self):
+        """Returns the current snapshot, reloading it from the database if it is missing or stale."""
+        snapshot = self._snapshot
+        if not self._expired(snapshot):
+            return snapshot
+        with self._lock:
+            # Another thread may have reloaded while we were waiting for the lock.
+            snapshot = self._snapshot
+            if self._expired(snapshot):
+                snapshot = self._load()
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        """Drops the cached snapshot so the next get() reloads both tables."""
+        self._snapshot = None
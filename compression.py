@@ -0,0 +1,70 @@
+# gzip compression of dynamic responses (HTML pages, JSON, exports).
+import gzip
+
+from flask import request
+
+# Types worth compressing. Images, archives and fonts are already compressed.
+DEFAULT_MIMETYPES = (
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+class Compressor:
+    """
+    Gzips responses after the view has produced them, when the client accepts gzip, the
+    type is in the allowlist and the body is larger than the threshold. Streamed bodies
+    (exports) and files sent straight from disk are left alone, as is anything that already
+    has a Content-Encoding, like the precompressed static assets.
+
+    App config: COMPRESS_MIN_SIZE (bytes), COMPRESS_LEVEL (1-9) and COMPRESS_MIMETYPES.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESS_LEVEL", 6)
+        app.config.setdefault("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES)
+        self.app = app
+        app.after_request(self.after_request)
+
+    def should_compress(self, response) -> bool:
+        config = self.app.config
+        return (
+            response.status_code >= 200
+            and response.status_code not in (204, 304)
+            and "Content-Encoding" not in response.headers
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and response.mimetype in config["COMPRESS_MIMETYPES"]
+            and request.accept_encodings["gzip"] > 0
+            and (response.content_length or 0) >= config["COMPRESS_MIN_SIZE"]
+        )
+
+    def after_request(self, response):
+        # Compressed or not, the body depends on Accept-Encoding for every candidate type
+        if response.mimetype in self.app.config["COMPRESS_MIMETYPES"]:
+            response.vary.add("Accept-Encoding")
+        if not self.should_compress(response):
+            return response
+
+        response.set_data(
+            gzip.compress(response.get_data(), compresslevel=self.app.config["COMPRESS_LEVEL"])
+        )
+        response.headers["Content-Encoding"] = "gzip"
+
+        # The compressed body is a different representation: keep the ETag only as a weak one,
+        # which still matches If-None-Match for the 304s.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,51 @@
+# Gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Every value can be overridden from the environment (or the .env file). Each worker has
+# its own connection pool of up to DB_POOL_MAX_SIZE connections (GUNICORN_THREADS + 1 by
+# default), so keep GUNICORN_WORKERS * DB_POOL_MAX_SIZE below MySQL's max_connections.
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Threaded workers: requests mostly wait on MySQL, and PBKDF2 runs on its own thread pool.
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Import the app (config, warm caches) once in the master; workers are forked from it.
+preload_app = True
+
+# Recycle each worker after this many requests, with jitter so they do not restart together.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")
+
+
+def when_ready(server):
+    # The workers have their own connections; the ones the master opened while warming up
+    # are no longer needed.
+    from main import db_pool
+
+    db_pool.close()
+
+
+def post_fork(server, worker):
+    # A forked worker starts with an empty pool (see ConnectionPool._check_fork); open
+    # its minimum connections before it accepts requests.
+    from main import db_pool
+
+    try:
+        db_pool.prefill()
+    except Exception as e:
+        server.log.warning("Could not prefill the connection pool: %s", e)
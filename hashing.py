@@ -0,0 +1,74 @@
+# Password hashing on a dedicated, size-limited worker pool.
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# KDF parameters of accounts created before they were stored per user.
+LEGACY_ALGORITHM = "sha256"
+LEGACY_ITERATIONS = 10000
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue stayed full for the whole wait and the request should fail."""
+
+
+class PasswordHasher:
+    """
+    Runs PBKDF2 on its own threads so a burst of logins cannot tie up every request
+    worker. hashlib releases the GIL while hashing, so the threads run in parallel.
+
+    algorithm / iterations: parameters used for new hashes.
+    max_workers: hashes computed at the same time.
+    max_queue: hashes allowed to wait for a worker.
+    Together they should stay below the request threads of a worker process.
+    queue_timeout: seconds a request waits for a place in the queue before HasherBusy is
+    raised, so a short burst queues up and only sustained saturation fails.
+    """
+
+    def __init__(self, algorithm="sha256", iterations=10000, max_workers=1, max_queue=2, queue_timeout=5.0):
+        hashlib.new(algorithm)  # Fail at startup on an unknown algorithm.
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pbkdf2"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.queue_timeout = queue_timeout
+
+    def _run(self, password: str, salt: bytes, algorithm: str, iterations: int) -> str:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy("Too many passwords are being hashed right now.")
+        try:
+            future = self._executor.submit(
+                hashlib.pbkdf2_hmac, algorithm, password.encode(), salt, iterations
+            )
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result().hex()
+
+    def hash(self, password: str, salt: bytes) -> str:
+        """Hashes a password with the current parameters and returns the hex digest."""
+        return self._run(password, salt, self.algorithm, self.iterations)
+
+    def verify(self, password: str, salt: bytes, expected: str, algorithm=None, iterations=None) -> bool:
+        """Checks a password against a stored hash made with the given parameters."""
+        hex_hash = self._run(
+            password,
+            salt,
+            algorithm or LEGACY_ALGORITHM,
+            iterations or LEGACY_ITERATIONS,
+        )
+        return hmac.compare_digest(hex_hash, expected)
+
+    def needs_rehash(self, algorithm, iterations) -> bool:
+        """Tells whether a stored hash was made with parameters other than the current ones."""
+        return (algorithm or LEGACY_ALGORITHM, iterations or LEGACY_ITERATIONS) != (
+            self.algorithm,
+            self.iterations,
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
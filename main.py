@@ -8,11 +8,39 @@ from flask import (
     redirect,
     request,
     jsonify,
+    Response,
+    send_from_directory,
 )
-import os
 import hashlib
+import hmac
+import mimetypes
+import os
+import time
+import click
+from jinja2 import FileSystemBytecodeCache
 from flaskext.mysql import MySQL  # Flask extension for MySQL integration.
-import random
+from pool import ConnectionPool  # Pool of reusable database connections.
+from catalog import CHAPTERS_QUERY, TESTS_QUERY, Catalog  # Cached chapters/tests curriculum tables.
+from question_bank import (  # Answer keys and question ids, kept in memory.
+    ANSWER_KEY_QUERY,
+    QUESTION_IDS_QUERY,
+    AnswerKeyIndex,
+    QuestionIndex,
+    bank_for,
+    normalize_answer,
+    questions_query,
+)
+from hashing import HasherBusy, PasswordHasher  # PBKDF2 on a bounded worker pool.
+import migrations  # Versioned schema migrations.
+import roster  # Keyset-paginated queries for the /students roster.
+from progress import PROGRESS_QUERY, ProgressCache  # Per-user progress, cached between page views.
+import question_import  # Bulk CSV/JSON question import.
+from render_cache import RenderCache, source_digest  # Rendered user-independent templates.
+import assets  # Fingerprinted, precompressed static assets.
+from compression import DEFAULT_MIMETYPES, Compressor  # gzip for dynamic responses.
+from metrics import Metrics  # Prometheus metrics for requests, queries and the pool.
+from slow_queries import SlowQueryLog  # Slow statements and their EXPLAIN plans.
+import profiling  # On-demand cProfile profiles of single requests.
 from dotenv import load_dotenv  # Import dotenv to load environment variables
 from datetime import timedelta
 
@@ -29,15 +57,196 @@ app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
 mysql = MySQL()
 app.config["MYSQL_DATABASE_USER"] = os.getenv("DB_USERNAME")
 app.config["MYSQL_DATABASE_PASSWORD"] = os.getenv("DB_PASSWORD")
-app.config["MYSQL_DATABASE_DB"] = "pythonista"
-app.config["MYSQL_DATABASE_HOST"] = "localhost"
+app.config["MYSQL_DATABASE_DB"] = os.getenv("DB_NAME", "pythonista")
+app.config["MYSQL_DATABASE_HOST"] = os.getenv("DB_HOST", "localhost")
 mysql.init_app(app)
 
+# Connection pool settings. Every route borrows its connection from the pool instead of
+# opening a new one, so a request only pays for the TCP/auth handshake when the pool grows.
+# A worker needs at most one connection per request thread, plus one for the background
+# slow-query EXPLAINs, so the pool is capped at GUNICORN_THREADS + 1 by default.
+app.config["DB_POOL_MIN_SIZE"] = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+app.config["DB_POOL_MAX_SIZE"] = int(
+    os.getenv("DB_POOL_MAX_SIZE", int(os.getenv("GUNICORN_THREADS", 4)) + 1)
+)
+app.config["DB_POOL_MAX_AGE"] = float(os.getenv("DB_POOL_MAX_AGE", 3600))
+app.config["DB_POOL_MAX_IDLE"] = float(os.getenv("DB_POOL_MAX_IDLE", 300))
+app.config["DB_POOL_PING_AFTER"] = float(os.getenv("DB_POOL_PING_AFTER", 5))
+app.config["DB_POOL_TIMEOUT"] = float(os.getenv("DB_POOL_TIMEOUT", 10))
+db_pool = ConnectionPool(
+    mysql.connect,
+    min_size=app.config["DB_POOL_MIN_SIZE"],
+    max_size=app.config["DB_POOL_MAX_SIZE"],
+    max_age=app.config["DB_POOL_MAX_AGE"],
+    max_idle=app.config["DB_POOL_MAX_IDLE"],
+    ping_after=app.config["DB_POOL_PING_AFTER"],
+    timeout=app.config["DB_POOL_TIMEOUT"],
+)
+
+# The chapters and tests tables only change when the curriculum does, so they are loaded once
+# and kept in memory. Call catalog.invalidate() after editing them.
+app.config["CATALOG_TTL"] = float(os.getenv("CATALOG_TTL", 600))
+catalog = Catalog(db_pool, ttl=app.config["CATALOG_TTL"])
+
+# Answer keys for both question banks, so /rightanswer grades from memory.
+app.config["ANSWER_KEYS_TTL"] = float(os.getenv("ANSWER_KEYS_TTL", 3600))
+answer_keys = AnswerKeyIndex(db_pool, ttl=app.config["ANSWER_KEYS_TTL"])
+
+# Question ids per chapter test, so /tests samples ids and fetches only the chosen rows.
+question_index = QuestionIndex(db_pool, ttl=app.config["ANSWER_KEYS_TTL"])
+
+# Password hashing runs on its own bounded pool. A request waits up to HASH_QUEUE_TIMEOUT seconds
+# for a place in its queue, so a burst of logins queues up; it fails only if the pool stays full.
+# Changing the algorithm or iteration count rehashes each account on its next successful login.
+app.config["PBKDF2_ALGORITHM"] = os.getenv("PBKDF2_ALGORITHM", "sha256")
+app.config["PBKDF2_ITERATIONS"] = int(os.getenv("PBKDF2_ITERATIONS", 10000))
+# HASH_WORKERS + HASH_QUEUE_SIZE should stay below GUNICORN_THREADS; the defaults leave one
+# request thread of each worker able to serve other pages while the others wait on hashing.
+app.config["HASH_WORKERS"] = int(os.getenv("HASH_WORKERS", 1))
+app.config["HASH_QUEUE_SIZE"] = int(
+    os.getenv("HASH_QUEUE_SIZE", max(int(os.getenv("GUNICORN_THREADS", 4)) - 2, 0))
+)
+app.config["HASH_QUEUE_TIMEOUT"] = float(os.getenv("HASH_QUEUE_TIMEOUT", 5))
+# Each student's progress (level, chapters, tests) is loaded with one query and cached per user.
+app.config["PROGRESS_CACHE_TTL"] = float(os.getenv("PROGRESS_CACHE_TTL", 300))
+app.config["PROGRESS_CACHE_SIZE"] = int(os.getenv("PROGRESS_CACHE_SIZE", 10000))
+progress_cache = ProgressCache(
+    db_pool,
+    catalog,
+    ttl=app.config["PROGRESS_CACHE_TTL"],
+    max_entries=app.config["PROGRESS_CACHE_SIZE"],
+)
+
+# Number of students per /students page (a ?size= of up to STUDENTS_MAX_PAGE_SIZE is honored).
+app.config["STUDENTS_PAGE_SIZE"] = int(os.getenv("STUDENTS_PAGE_SIZE", 50))
+app.config["STUDENTS_MAX_PAGE_SIZE"] = int(os.getenv("STUDENTS_MAX_PAGE_SIZE", 200))
+
+# Level placement tiers as "level=minimum score" pairs, lowest first; scores below the first are
+# "beginner". Tier k is granted the first k curriculum sections, and the top tier every section but
+# the last, so the grants follow the chapters/tests tables as the curriculum grows. Sections end at
+# the chapters named with catalog.SECTION_END_SUFFIX ("BasicsTest", ...); see catalog.py. There
+# must be fewer tiers than sections, or two tiers would get the same grant: warm_up() checks it.
+app.config["LEVEL_TIERS"] = [
+    (name.strip(), float(minimum))
+    for name, minimum in (
+        tier.split("=") for tier in os.getenv("LEVEL_TIERS", "intermediate=40,expert=70").split(",")
+    )
+]
+
+# Rendered chapter fragments (and other user-independent templates) are kept in memory.
+# A chapter fragment requested with its current version is cached by the browser for a year.
+app.config["RENDER_CACHE_SIZE"] = int(os.getenv("RENDER_CACHE_SIZE", 256))
+app.config["CHAPTER_CONTENT_MAX_AGE"] = int(os.getenv("CHAPTER_CONTENT_MAX_AGE", 31536000))
+render_cache = RenderCache(max_entries=app.config["RENDER_CACHE_SIZE"])
+
+# Compiled templates are cached on disk so new workers skip compiling them. By default they go
+# to Jinja's private per-user directory, which it creates owner-only and checks before use:
+# the cached bytecode is executed, so it must not be writable by anyone else. JINJA_CACHE_DIR
+# names another directory (created owner-only); set it to "" to disable the cache.
+app.config["JINJA_CACHE_DIR"] = os.getenv("JINJA_CACHE_DIR")
+if app.config["JINJA_CACHE_DIR"] is None:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+elif app.config["JINJA_CACHE_DIR"]:
+    os.makedirs(app.config["JINJA_CACHE_DIR"], mode=0o700, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_CACHE_DIR"])
+
+# Static files are served from their content-hashed copies once `flask --app main build-assets`
+# has run; those never change, so browsers may cache them for ASSETS_MAX_AGE without revalidating.
+app.config["ASSETS_MAX_AGE"] = int(os.getenv("ASSETS_MAX_AGE", 31536000))
+static_assets = assets.Assets(app.static_folder)
+
+
+def asset_url_for(endpoint, **values):
+    """url_for for templates: static files resolve to their fingerprinted copy when built."""
+    if endpoint == "static" and "filename" in values:
+        values["filename"] = static_assets.url(values["filename"])
+    return url_for(endpoint, **values)
+
+
+app.jinja_env.globals["url_for"] = asset_url_for
+
+
+def static_file(filename):
+    """
+    Serves static files. Fingerprinted copies are immutable and get a year-long Cache-Control,
+    and their precompressed gzip variant when the client accepts it.
+    """
+    if not static_assets.is_fingerprinted(filename):
+        return app.send_static_file(filename)
+
+    max_age = app.config["ASSETS_MAX_AGE"]
+    variant = static_assets.gzip_variant(filename)
+    if variant and request.accept_encodings["gzip"]:
+        response = send_from_directory(
+            app.static_folder,
+            variant,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            max_age=max_age,
+        )
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=max_age)
+    if variant:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+app.view_functions["static"] = static_file
+
+# Dynamic responses (pages, JSON) larger than COMPRESS_MIN_SIZE bytes are gzipped for clients
+# that accept it. COMPRESS_MIMETYPES is a comma-separated allowlist.
+app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", 500))
+app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", 6))
+app.config["COMPRESS_MIMETYPES"] = tuple(
+    mimetype.strip()
+    for mimetype in os.getenv("COMPRESS_MIMETYPES", ",".join(DEFAULT_MIMETYPES)).split(",")
+)
+Compressor(app)
+
+# Request latency, query and pool metrics, served on /metrics in the Prometheus text format.
+# The endpoint is disabled (404) unless METRICS_TOKEN is set; scrapers send it as a bearer token.
+app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")
+metrics = Metrics(app, db_pool)
+
+# Statements slower than SLOW_QUERY_MS milliseconds are appended to SLOW_QUERY_LOG (JSON lines)
+# with their route and parameter types, plus their EXPLAIN plan the first time. 0 disables it.
+# The log lives in the app's instance folder unless SLOW_QUERY_LOG names another file.
+app.config["SLOW_QUERY_MS"] = float(os.getenv("SLOW_QUERY_MS", 200))
+app.config["SLOW_QUERY_LOG"] = os.getenv(
+    "SLOW_QUERY_LOG", os.path.join(app.instance_path, "slow-queries.jsonl")
+)
+SlowQueryLog(app, db_pool)
+
+# Requests can be profiled on demand into PROFILE_DIR (one pstats file per request, grouped by
+# route): with a signed X-Profile header, from a teacher's session or one in PROFILE_SAMPLE_RATE.
+# Without PROFILE_DIR profiling is off and costs nothing.
+app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", "")
+app.config["PROFILE_SAMPLE_RATE"] = int(os.getenv("PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILE_TOKEN_MAX_AGE"] = int(os.getenv("PROFILE_TOKEN_MAX_AGE", 3600))
+request_profiler = profiling.RequestProfiler(app)
+
+# Questions per multi-row INSERT when bulk importing (the whole import is one transaction).
+app.config["QUESTION_IMPORT_BATCH_SIZE"] = int(os.getenv("QUESTION_IMPORT_BATCH_SIZE", 500))
+
+password_hasher = PasswordHasher(
+    algorithm=app.config["PBKDF2_ALGORITHM"],
+    iterations=app.config["PBKDF2_ITERATIONS"],
+    max_workers=app.config["HASH_WORKERS"],
+    max_queue=app.config["HASH_QUEUE_SIZE"],
+    queue_timeout=app.config["HASH_QUEUE_TIMEOUT"],
+)
+
 
 # This function is executed before each request to make the session permanent, with a custom timeout.
 @app.before_request
 def make_session_permanent():
     """Sets session to be permanent and configures the lifetime to 10 minutes."""
+    # Static files must not touch the session: that would add Set-Cookie and Vary: Cookie
+    # to responses meant to be cached by browsers and shared proxies.
+    if request.endpoint == "static":
+        return
     session.permanent = True
     app.permanent_session_lifetime = timedelta(minutes=10)
 
@@ -46,7 +255,7 @@ def make_session_permanent():
 @app.errorhandler(404)
 def not_found(e):
     """Renders a custom error page when a 404 error occurs."""
-    return render_template("error.html"), 404  # Explicitly return the 404 status code.
+    return render_page("error.html"), 404  # Explicitly return the 404 status code.
 
 
 # Routes for the home page.
@@ -55,7 +264,117 @@ def not_found(e):
 @app.route("/home")
 def home():
     """Renders the home (index) page."""
-    return render_template("index.html")
+    return render_page("index.html")
+
+
+def cached_render(key, template: str, **context):
+    """
+    Renders a template whose output depends only on key, once per process.
+    Returns a render_cache.Rendered (body bytes and ETag).
+    """
+    if app.jinja_env.auto_reload:
+        render_cache.clear()  # Pick up template edits while developing.
+    return render_cache.get(key, lambda: render_template(template, **context))
+
+
+def render_page(template: str, per_user=False):
+    """
+    Renders a page whose output only depends on the session's login state (plus the username
+    with per_user) from the render cache. A request with flashed messages waiting is rendered
+    normally, so the messages are shown and consumed.
+    """
+    if "_flashes" in session:
+        return render_template(template)
+    key = (
+        "page",
+        template,
+        "username" in session,
+        "teacher" in session,
+        session.get("username") if per_user else None,
+    )
+    return cached_render(key, template).body
+
+
+def chapter_content(chapter: str):
+    """Returns the rendered body of one chapter (templates/chapters/<chapter>.html)."""
+    return cached_render(("chapter", chapter), f"chapters/{chapter}.html")
+
+
+def chapter_content_versions() -> dict:
+    """Maps every chapter to the version (ETag) of its rendered body, for versioned fragment URLs."""
+    return {chapter: chapter_content(chapter).etag for chapter in catalog.get().chapters}
+
+
+# Digest of the templates, so page validators change with every deploy that changes a page.
+templates_version = source_digest(os.path.join(app.root_path, app.template_folder))
+
+
+def page_etag(*parts) -> str:
+    """
+    Builds the ETag of a page from the values its output depends on, without rendering it:
+    the given parts plus the templates, static assets, curriculum and logged-in user.
+    """
+    values = (
+        templates_version,
+        static_assets.version,
+        catalog.get().version,
+        session.get("id"),
+        session.get("username"),
+    ) + parts
+    return hashlib.sha256(repr(values).encode()).hexdigest()[:32]
+
+
+def not_modified(etag: str):
+    """
+    Returns a 304 response when the request's If-None-Match matches etag, otherwise None.
+    Requests with flashed messages waiting always get a full page, so the messages are shown.
+    """
+    if "_flashes" in session or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag: str):
+    """Sets the page's ETag; the browser must revalidate it before reusing its copy."""
+    response = app.make_response(response)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def progress_etag(page: str) -> str:
+    """
+    ETag of a page built from the logged-in user's progress. The progress version changes
+    with every write made in this session; the time bucket bounds how long writes made in
+    another session of the same account can go unnoticed, like the progress cache TTL does.
+    """
+    bucket = int(time.time() // app.config["PROGRESS_CACHE_TTL"])
+    return page_etag(page, session.get("progress_version"), bucket)
+
+
+def current_progress():
+    """Returns the logged-in user's progress, from the progress cache when it is current."""
+    return progress_cache.get(session["id"], session.get("progress_version"))
+
+
+def progress_changed():
+    """
+    Must be called after writing the user's progress: drops the cached copy and gives the
+    session a new progress version, so no worker serves the old one to this user again.
+    """
+    progress_cache.invalidate(session["id"])
+    session["progress_version"] = os.urandom(8).hex()
+
+
+# Account queries, shared with `flask --app main migrate --explain`.
+LOGIN_QUERY = (
+    "SELECT email, password, salt, username, age, user_id, teacher, kdf_algorithm, kdf_iterations "
+    "FROM users_info WHERE email = %s"
+)
+EXISTING_USER_QUERY = "SELECT username, email FROM users_info WHERE username = %s OR email = %s"
+USER_ID_QUERY = "SELECT user_id FROM users_info WHERE username = %s"
 
 
 @app.route("/login", methods=["GET", "POST"])
@@ -78,12 +397,11 @@ def login():
 
         # Connect to the database
         try:
-            connection = mysql.connect()
+            connection = db_pool.connect()
             cursor = connection.cursor()
 
             # Use a parameterized query to prevent SQL injection
-            query = "SELECT email, password, salt, username, age, user_id, teacher FROM users_info WHERE email = %s"
-            cursor.execute(query, (email,))
+            cursor.execute(LOGIN_QUERY, (email,))
             records = cursor.fetchall()
 
             # Ensure connection is closed properly
@@ -96,14 +414,18 @@ def login():
 
         # Iterate through fetched records (though usually should be just one if emails are unique)
         for row in records:
-            # Generate hash from the entered password using the stored salt
-            salt = row[2]  # Assuming salt is stored securely
-            hex_hash = hashlib.pbkdf2_hmac(
-                "sha256", password.encode(), salt, 10000
-            ).hex()
+            # Hash the entered password with the stored salt and the user's own KDF parameters
+            try:
+                matches = password_hasher.verify(password, row[2], row[1], row[7], row[8])
+            except HasherBusy:
+                return jsonify({"error": "The server is busy, please try again in a moment."}), 503
 
             # Check if the hashed password matches the stored hash
-            if hex_hash == row[1]:
+            if matches:
+                # Upgrade hashes made with older KDF parameters while we have the plain password
+                if password_hasher.needs_rehash(row[7], row[8]):
+                    rehash_password(row[5], password)
+
                 # Clear any previous session data to prevent session fixation attacks
                 session.clear()
 
@@ -111,6 +433,7 @@ def login():
                 session["username"] = row[3]
                 session["age"] = row[4]
                 session["id"] = row[5]
+                session["progress_version"] = os.urandom(8).hex()
 
                 # Check if the user is a teacher and return the appropriate response
                 if row[6] == 1:
@@ -125,6 +448,32 @@ def login():
         return jsonify({"error": "The given password is incorrect. Please try again!"})
 
 
+def rehash_password(user_id: int, password: str):
+    """
+    Re-hashes a user's password with the current KDF parameters and stores it.
+    Failures are only logged: the user is already authenticated and will be retried next login.
+    """
+    try:
+        salt = os.urandom(32)
+        hex_hash = password_hasher.hash(password, salt)
+        with db_pool.connect() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE users_info SET password = %s, salt = %s, kdf_algorithm = %s, kdf_iterations = %s "
+                    "WHERE user_id = %s",
+                    (
+                        hex_hash,
+                        salt,
+                        password_hasher.algorithm,
+                        password_hasher.iterations,
+                        user_id,
+                    ),
+                )
+                connection.commit()
+    except Exception as e:
+        print(f"Error rehashing password for user {user_id}: {e}")
+
+
 @app.route("/signup", methods=["POST"])
 def signup():
     """Handle user sign up with form data validation and secure password storage."""
@@ -137,14 +486,11 @@ def signup():
 
     # Check if the email or username already exists
     try:
-        connection = mysql.connect()
+        connection = db_pool.connect()
         cursor = connection.cursor()
 
         # Use parameterized queries to check if the username or email is already taken
-        cursor.execute(
-            "SELECT username, email FROM users_info WHERE username = %s OR email = %s",
-            (username, email),
-        )
+        cursor.execute(EXISTING_USER_QUERY, (username, email))
         records = cursor.fetchall()
 
         # Check if the username or email is already registered
@@ -156,23 +502,39 @@ def signup():
             elif email == row[1]:
                 return jsonify({"info": "Email already exists, please try logging in!"})
 
-        # If the username/email are unique, create a new user
-        # Generate a random salt and hash the password securely
+        # Generate a random salt and hash the password securely on the hashing pool,
+        # only once the account is known to be new
         salt = os.urandom(32)
-        hex_hash = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 10000).hex()
+        try:
+            hex_hash = password_hasher.hash(password, salt)
+        except HasherBusy:
+            return jsonify({"error": "The server is busy, please try again in a moment."}), 503
 
-        # Insert new user details into the database with a parameterized query
+        # If the username/email are unique, create a new user
+        # Insert new user details, including the KDF parameters used, with a parameterized query
         cursor.execute(
-            "INSERT INTO users_info (username, email, password, salt, age) VALUES (%s, %s, %s, %s, %s)",
-            (username, email, hex_hash, salt, age),
+            "INSERT INTO users_info (username, email, password, salt, age, kdf_algorithm, kdf_iterations) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (
+                username,
+                email,
+                hex_hash,
+                salt,
+                age,
+                password_hasher.algorithm,
+                password_hasher.iterations,
+            ),
         )
-        connection.commit()
 
         # Retrieve the user_id of the newly inserted user
+        cursor.execute(USER_ID_QUERY, (username,))
+        user_id = cursor.fetchone()[0]  # Assuming username is unique, fetch one record
+
+        # Every student gets a stats row up front so the roster can be read from student_stats alone
         cursor.execute(
-            "SELECT user_id FROM users_info WHERE username = %s", (username,)
+            "INSERT INTO student_stats (user_id, last_activity) VALUES (%s, NOW(6))", (user_id,)
         )
-        user_id = cursor.fetchone()[0]  # Assuming username is unique, fetch one record
+        connection.commit()
 
     except Exception as e:
         # Log the error in production for better debugging
@@ -193,6 +555,7 @@ def signup():
     session["id"] = user_id
     session["username"] = username
     session["age"] = age
+    session["progress_version"] = os.urandom(8).hex()
 
     # Return a success message to the user
     return jsonify({"success": f"Welcome {username}!"})
@@ -210,65 +573,43 @@ def chapters():
     if request.method == "GET":
         # Ensure user is logged in and not a teacher
         if "username" in session and "teacher" not in session:
-            try:
-                # Fetch user-specific data from the database
-                connection = mysql.connect()
-                cursor = connection.cursor()
-
-                # Check if user has a level assigned
-                cursor.execute(
-                    "SELECT * FROM levels WHERE user_id=%s", (session["id"],)
+            # Answer revalidations from the progress version, before any DB read or render
+            etag = progress_etag("chapters")
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+
+            # The user's level, chapters and tests come from the progress cache
+            progress = current_progress()
+
+            # Check if user has a level assigned
+            if progress.level is None:
+                flash(placement_message(), "info")
+                return with_etag(
+                    render_template("chapters.html", content_versions=chapter_content_versions()),
+                    etag,
                 )
-                result = cursor.fetchall()
 
-                if len(result) == 0:
-                    flash(
-                        "Wanna take a test to determine your level and possibly skip a couple of chapters? "
-                        "If you score 0% to 39% you will be assigned as a beginner. If you score 40% to 69%, "
-                        "you will be assigned as an intermediate. If you score 70% to 100%, you will be assigned as an expert.",
-                        "info",
-                    )
-                    return render_template("chapters.html")
-
-                # Fetch completed chapters and tests for the user
-                cursor.execute(
-                    "SELECT chapter_name FROM chapters_users_info WHERE user_id=%s",
-                    (session["id"],),
-                )
-                chapters = cursor.fetchall()
-
-                cursor.execute(
-                    "SELECT tests.test_name, score FROM tests "
-                    "INNER JOIN tests_users_info ON tests.test_name=tests_users_info.test_name "
-                    "WHERE user_id=%s AND score > 50 ORDER BY tests.id",
-                    (session["id"],),
-                )
-                tests = cursor.fetchall()
-
-                # Fetch all available chapters and tests
-                cursor.execute("SELECT chapter_name FROM chapters ORDER BY id")
-                all_chapters = cursor.fetchall()
-
-                cursor.execute("SELECT test_name FROM tests ORDER BY id")
-                all_tests = cursor.fetchall()
-
-            finally:
-                # Ensure the connection is closed
-                connection.close()
+            # All available chapters and tests come from the cached catalog
+            curriculum = catalog.get()
 
             # Format data for display
-            completed_chapters = [row[0] for row in chapters]
-            completed_tests = [row[0] for row in tests]
-            all_chapters_formatted = [row[0] for row in all_chapters]
-            all_tests_formatted = [row[0] for row in all_tests]
+            completed_chapters = list(progress.chapters)
+            completed_tests = progress.passed_tests()
+            all_chapters_formatted = list(curriculum.chapters)
+            all_tests_formatted = list(curriculum.tests)
 
             # Render the chapters template with user progress
-            return render_template(
-                "chapters.html",
-                chapters=completed_chapters,
-                tests=completed_tests,
-                all_chapters=all_chapters_formatted,
-                all_tests=all_tests_formatted,
+            return with_etag(
+                render_template(
+                    "chapters.html",
+                    chapters=completed_chapters,
+                    tests=completed_tests,
+                    all_chapters=all_chapters_formatted,
+                    all_tests=all_tests_formatted,
+                    content_versions=chapter_content_versions(),
+                ),
+                etag,
             )
         else:
             # Redirect to login if user is not logged in or is a teacher
@@ -283,42 +624,33 @@ def chapters():
         if "username" in session and "teacher" not in session:
             curr_chapter = request.form["chapter"]
 
+            # Look up the current chapter ID in the cached catalog
+            curr_chapter_id = catalog.get().chapter_ids.get(curr_chapter)
+
+            if not curr_chapter_id:
+                return jsonify({"error": "Invalid chapter name."})
+
             try:
-                connection = mysql.connect()
+                connection = db_pool.connect()
                 cursor = connection.cursor()
 
-                # Fetch the completed chapters for the user
+                # The chapter unlocks only if it directly follows the user's highest completed chapter.
+                # Checking and advancing the mark in one conditional write makes a concurrent
+                # double-submit lose cleanly instead of racing to the primary key.
                 cursor.execute(
-                    "SELECT id FROM chapters_users_info "
-                    "INNER JOIN chapters ON chapters_users_info.chapter_name = chapters.chapter_name "
-                    "WHERE user_id = %s ORDER BY id",
-                    (session["id"],),
+                    "UPDATE student_stats SET max_chapter_id = %s, last_activity = NOW(6) "
+                    "WHERE user_id = %s AND max_chapter_id = %s",
+                    (curr_chapter_id, session["id"], curr_chapter_id - 1),
                 )
-                chapters = cursor.fetchall()
-
-                # Fetch the current chapter ID
-                cursor.execute(
-                    "SELECT id FROM chapters WHERE chapter_name = %s", (curr_chapter,)
-                )
-                curr_chapter_id = cursor.fetchone()
-
-                if not curr_chapter_id:
-                    return jsonify({"error": "Invalid chapter name."})
-
-                curr_chapter_id = curr_chapter_id[0]
-
-                # Check if the user has completed previous chapters in order
-                valid = all(chapters[i][0] == i + 1 for i in range(len(chapters)))
-                if len(chapters) + 1 != curr_chapter_id:
-                    valid = False
 
-                if valid:
+                if cursor.rowcount == 1:
                     # Insert the new chapter into the user's completed list
                     cursor.execute(
                         "INSERT INTO chapters_users_info (user_id, chapter_name) VALUES (%s, %s)",
                         (session["id"], curr_chapter),
                     )
                     connection.commit()
+                    progress_changed()
                     return jsonify({"success": "completed"})
                 else:
                     return jsonify(
@@ -334,6 +666,31 @@ def chapters():
             return jsonify({"error": "Unauthorized request."})
 
 
+@app.route("/chapters/<chapter>/content", methods=["GET"])
+def chapter_content_fragment(chapter):
+    """
+    Returns the body of one chapter as an HTML fragment; the /chapters page fetches it the
+    first time the chapter is opened. Requested with ?v=<current version> the fragment is
+    immutable and cached by the browser, otherwise it is revalidated through its ETag.
+    """
+    if "username" not in session or "teacher" in session:
+        return jsonify({"error": "Unauthorized request."}), 403
+
+    if chapter not in catalog.get().chapter_ids:
+        return not_found(None)
+
+    rendered = chapter_content(chapter)
+    response = Response(rendered.body, mimetype="text/html")
+    response.set_etag(rendered.etag)
+    response.cache_control.private = True
+    if request.args.get("v") == rendered.etag:
+        response.cache_control.max_age = app.config["CHAPTER_CONTENT_MAX_AGE"]
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @app.route("/tests", methods=["GET", "POST"])
 def tests():
     """
@@ -363,7 +720,7 @@ def tests():
             # Special case for level test
             elif curr_test == "levels":
                 try:
-                    with mysql.connect() as connection:
+                    with db_pool.connect() as connection:
                         with connection.cursor() as cursor:
                             cursor.execute(
                                 "SELECT question_type, question, multiple1, multiple2, multiple3, multiple4, chapter_name, subchapter, test_id "
@@ -376,56 +733,35 @@ def tests():
                     )
                     return redirect(url_for("chapters"))
 
+                remember_served_test(curr_test, questions)
                 return render_template("test.html", questions=questions)
 
             # Handle chapter-specific tests
             else:
                 try:
-                    with mysql.connect() as connection:
+                    with db_pool.connect() as connection:
                         with connection.cursor() as cursor:
-                            # Fetch the user's completed tests
-                            cursor.execute(
-                                "SELECT id FROM tests_users_info "
-                                "INNER JOIN tests ON tests_users_info.test_name = tests.test_name "
-                                "WHERE user_id = %s ORDER BY id",
-                                (session["id"],),
-                            )
-                            user_tests = cursor.fetchall()
-
-                            # Get the current test's ID
-                            cursor.execute(
-                                "SELECT id FROM tests WHERE test_name = %s",
-                                (curr_test,),
-                            )
-                            curr_test_id = cursor.fetchone()
+                            # Get the current test's ID from the cached catalog
+                            curr_test_id = catalog.get().test_ids.get(curr_test)
 
                             if not curr_test_id:
                                 flash("The selected test does not exist.", "error")
                                 return redirect(url_for("chapters"))
 
-                            # Check if the user is eligible to take the test
-                            valid = all(
-                                user_tests[i][0] == i + 1
-                                for i in range(len(user_tests))
-                            )
-                            if len(user_tests) + 1 != curr_test_id[0]:
-                                valid = False
-
-                            if valid:
-                                # Fetch the questions for the selected test
-                                cursor.execute(
-                                    "SELECT question_type, question, multiple1, multiple2, multiple3, multiple4, chapter_name, subchapter, test_id "
-                                    "FROM tests_questions WHERE test_name = %s",
-                                    (curr_test,),
-                                )
-                                questions = cursor.fetchall()
-
+                            # The user may take the test that follows their highest passed test
+                            if current_progress().max_test_id + 1 == curr_test_id:
                                 # Randomize the number of questions displayed based on test type
                                 if curr_test.startswith(("C", "Q")):
-                                    questions = random.sample(questions, 3)
+                                    question_ids = question_index.sample(curr_test, 3)
                                 else:
-                                    questions = random.sample(questions, 6)
+                                    question_ids = question_index.sample(curr_test, 6)
+
+                                # Fetch only the sampled questions, keeping the sampled order
+                                cursor.execute(questions_query(len(question_ids)), question_ids)
+                                rows = {row[8]: row for row in cursor.fetchall()}
+                                questions = [rows[i] for i in question_ids if i in rows]
 
+                                remember_served_test(curr_test, questions)
                                 return render_template("test.html", questions=questions)
 
                             else:
@@ -447,6 +783,14 @@ def tests():
             return redirect(url_for("login"))
 
 
+def remember_served_test(test: str, questions):
+    """
+    Stores the ids of the questions served for a test in the session, so /gradetest
+    grades exactly those questions.
+    """
+    session["served_test"] = {"test": test, "questions": [q[8] for q in questions]}
+
+
 @app.route("/profile", methods=["GET"])
 def profile():
     """
@@ -458,38 +802,25 @@ def profile():
         flash("You must be logged in to view your profile.", "info")
         return redirect(url_for("login"))
 
-    try:
-        with mysql.connect() as connection:
-            with connection.cursor() as cursor:
-                # Fetch the chapters the user has completed
-                cursor.execute(
-                    "SELECT chapters.chapter_name FROM chapters_users_info "
-                    "LEFT OUTER JOIN chapters ON chapters_users_info.chapter_name = chapters.chapter_name "
-                    "WHERE user_id = %s ORDER BY chapters.id",
-                    (session["id"],),
-                )
-                completed_chapters = cursor.fetchall()
+    # Answer revalidations from the progress version, before any DB read or render
+    etag = progress_etag("profile")
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
 
-                # Fetch all available chapters and tests
-                cursor.execute("SELECT chapter_name FROM chapters ORDER BY id")
-                all_chapters = cursor.fetchall()
-
-                cursor.execute("SELECT test_name FROM tests ORDER BY id")
-                all_tests = cursor.fetchall()
+    try:
+        # Completed chapters and tests with scores, shaped like the rows the template expects
+        progress = current_progress()
+        completed_chapters = [(name,) for name in progress.chapters]
+        completed_tests = list(progress.tests)
 
-                # Fetch the user's completed tests and their scores
-                cursor.execute(
-                    "SELECT tests.test_name, score FROM tests_users_info "
-                    "LEFT OUTER JOIN tests ON tests_users_info.test_name = tests.test_name "
-                    "WHERE user_id = %s ORDER BY tests.id",
-                    (session["id"],),
-                )
-                completed_tests = cursor.fetchall()
+        # All available chapters and tests, shaped like the rows the template expects
+        curriculum = catalog.get()
+        all_chapters = [(name,) for name in curriculum.chapters]
+        all_tests = [(name,) for name in curriculum.tests]
 
         # Calculate the sum and average score
-        total_score = (
-            sum(int(test[1]) for test in completed_tests) if completed_tests else 0
-        )
+        total_score = progress.total_score
         average_score = total_score / len(completed_tests) if completed_tests else "-"
 
     except Exception as e:
@@ -499,14 +830,17 @@ def profile():
         return redirect(url_for("home"))
 
     # Render the profile template with the user's data
-    return render_template(
-        "profile.html",
-        chapters=completed_chapters,
-        tests=completed_tests,
-        all_chapters=all_chapters,
-        all_tests=all_tests,
-        average=average_score,
-        sum=total_score,
+    return with_etag(
+        render_template(
+            "profile.html",
+            chapters=completed_chapters,
+            tests=completed_tests,
+            all_chapters=all_chapters,
+            all_tests=all_tests,
+            average=average_score,
+            sum=total_score,
+        ),
+        etag,
     )
 
 
@@ -528,7 +862,7 @@ def python():
     """
     if "teacher" in session:
         return redirect(url_for("admin"))
-    return render_template("python.html")
+    return render_page("python.html")
 
 
 @app.route("/admin", methods=["GET"])
@@ -537,7 +871,7 @@ def admin():
     Displays the admin dashboard for teachers. Redirects non-teachers to the login page.
     """
     if "username" in session and "teacher" in session:
-        return render_template("admin.html")
+        return render_page("admin.html", per_user=True)
     else:
         flash(
             "You must be logged in with a teacher account to access this page.", "error"
@@ -555,13 +889,10 @@ def questions():
     if request.method == "GET":
         if "username" in session and "teacher" in session:
             try:
-                with mysql.connect() as connection:
-                    with connection.cursor() as cursor:
-                        # Fetch available tests and chapters for the form
-                        cursor.execute("SELECT test_name FROM tests ORDER BY id")
-                        tests = cursor.fetchall()
-                        cursor.execute("SELECT chapter_name FROM chapters ORDER BY id")
-                        chapters = cursor.fetchall()
+                # Fetch available tests and chapters for the form
+                curriculum = catalog.get()
+                tests = [(name,) for name in curriculum.tests]
+                chapters = [(name,) for name in curriculum.chapters]
             except Exception as e:
                 print(f"Error fetching data for /questions GET request: {e}")
                 flash("An error occurred while fetching data.", "error")
@@ -606,7 +937,7 @@ def questions():
         right_answer = request.form["right_answer"]
 
         try:
-            with mysql.connect() as connection:
+            with db_pool.connect() as connection:
                 with connection.cursor() as cursor:
                     # Insert the question into the database
                     cursor.execute(
@@ -626,6 +957,12 @@ def questions():
                         ),
                     )
                     connection.commit()
+
+                    # Make the new question gradable and servable without reloading the whole bank
+                    answer_keys.add(
+                        "tests", cursor.lastrowid, right_answer, chapter_name, subchapter
+                    )
+                    question_index.add(test_name, cursor.lastrowid)
         except Exception as e:
             print(f"Error submitting question: {e}")
             flash("An error occurred while submitting the question.", "error")
@@ -635,46 +972,128 @@ def questions():
         return redirect(url_for("questions"))
 
 
+def run_question_import(rows, dry_run=False):
+    """
+    Validates and inserts imported question rows, then refreshes the in-memory question banks
+    so the new questions are served and graded right away. Returns a question_import.ImportReport.
+    """
+    with db_pool.connect() as connection:
+        report = question_import.import_questions(
+            connection,
+            rows,
+            catalog.get(),
+            dry_run=dry_run,
+            batch_size=app.config["QUESTION_IMPORT_BATCH_SIZE"],
+        )
+    if report.imported and not report.dry_run:
+        answer_keys.invalidate()
+        question_index.invalidate()
+    return report
+
+
+@app.route("/questions/import", methods=["POST"])
+def import_questions():
+    """
+    Imports many questions at once from an uploaded CSV or JSON file, for teacher accounts.
+    Form fields: file, format (csv or json, guessed from the file name if missing) and dry_run.
+    Nothing is written unless every row is valid; the response lists the errors per row.
+    """
+    if "username" not in session or "teacher" not in session:
+        return jsonify({"error": "Unauthorized request."}), 403
+
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Please choose a CSV or JSON file to import."}), 400
+
+    file_format = request.form.get("format") or question_import.format_for(upload.filename)
+    dry_run = request.form.get("dry_run") in ("1", "true", "on")
+
+    try:
+        rows = question_import.parse_rows(upload.read(), file_format)
+        report = run_question_import(rows, dry_run=dry_run)
+    except question_import.ImportFormatError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error importing questions: {e}")
+        return jsonify({"error": "An error occurred while importing the questions."}), 500
+
+    errors = [{"row": row, "message": message} for row, message in report.errors]
+    if errors:
+        return jsonify(
+            {
+                "error": f"{len({row for row, _ in report.errors})} row(s) have errors, nothing was imported.",
+                "errors": errors,
+            }
+        ), 400
+    if report.dry_run:
+        return jsonify({"success": f"All {report.imported} question(s) are valid.", "imported": 0})
+    return jsonify(
+        {"success": f"Imported {report.imported} question(s).", "imported": report.imported}
+    )
+
+
 @app.route("/students", methods=["GET"])
 def students():
     """
-    Displays a list of students with their scores, accessible only by teacher accounts.
+    Displays one page of students with their scores, accessible only by teacher accounts.
+    Query parameters: sort (username, average or tests), order (asc or desc),
+    q (username/email prefix), size (page size) and after (cursor of the next page).
     """
     if "username" in session and "teacher" in session:
+        # Validate the paging, sorting and filtering options
+        sort = request.args.get("sort", "username")
+        if sort not in roster.SORT_COLUMNS:
+            sort = "username"
+        descending = request.args.get("order", "asc") == "desc"
+        prefix = request.args.get("q", "").strip()
+        size = request.args.get("size", app.config["STUDENTS_PAGE_SIZE"], type=int)
+        size = max(1, min(size, app.config["STUDENTS_MAX_PAGE_SIZE"]))
+        after = request.args.get("after")
+        if after:
+            after = roster.decode_cursor(after, sort)
+
         try:
-            with mysql.connect() as connection:
+            with db_pool.connect() as connection:
                 with connection.cursor() as cursor:
-                    # Query to fetch student information and scores
-                    query = """
-                        SELECT username, email, GROUP_CONCAT(id) AS ids, GROUP_CONCAT(score) AS scores
-                        FROM (
-                            SELECT username, email, id, score
-                            FROM (
-                                SELECT username, email, test_name, score
-                                FROM tests_users_info
-                                RIGHT JOIN users_info ON users_info.user_id = tests_users_info.user_id
-                                WHERE teacher IS NULL
-                            ) AS T
-                            LEFT JOIN tests ON tests.test_name = T.test_name
-                            ORDER BY id
-                        ) AS B
-                        GROUP BY username
-                    """
-                    cursor.execute(query)
-                    students = cursor.fetchall()
-
-            # Process student scores to calculate averages
-            students = [list(student) for student in students]
-            for student in students:
-                scores = student[3]
-                if scores:
-                    scores_list = list(map(int, scores.split(",")))
-                    average_score = sum(scores_list) / len(scores_list)
-                    student.append(average_score)
-                else:
-                    student.append("-")
+                    # Every change to a student's results moves the roster version, so a
+                    # revalidation costs one index lookup instead of the page queries and render
+                    etag = page_etag("students", roster.roster_version(cursor), request.full_path)
+                    unchanged = not_modified(etag)
+                    if unchanged:
+                        return unchanged
+
+                    # One index range scan for the page, then the scores of just these students
+                    rows, next_cursor = roster.fetch_page(
+                        cursor, sort, descending, prefix, after or None, size
+                    )
+                    scores = roster.fetch_scores(cursor, [row[0] for row in rows])
+
+            # One cell per test, in curriculum order, plus the average score
+            all_tests = catalog.get().tests
+            students = []
+            for user_id, username, email, score_sum, score_count, _, _ in rows:
+                user_scores = scores.get(user_id, {})
+                students.append(
+                    [
+                        username,
+                        email,
+                        [user_scores.get(test, "-") for test in all_tests],
+                        score_sum / score_count if score_count else "-",
+                    ]
+                )
 
-            return render_template("students.html", students=students)
+            return with_etag(
+                render_template(
+                    "students.html",
+                    students=students,
+                    sort=sort,
+                    order="desc" if descending else "asc",
+                    q=prefix,
+                    size=size,
+                    next_cursor=next_cursor,
+                ),
+                etag,
+            )
         except Exception as e:
             print(f"Error fetching students data: {e}")
             flash("An error occurred while fetching student data.", "error")
@@ -685,10 +1104,64 @@ def students():
         return redirect(url_for("login"))
 
 
+@app.route("/students/export", methods=["GET"])
+def export_students():
+    """
+    Streams every student's per-test scores as CSV (default) or NDJSON (?format=ndjson),
+    accessible only by teacher accounts.
+    """
+    if "username" in session and "teacher" in session:
+        export_format = request.args.get("format", "csv")
+        if export_format not in ("csv", "ndjson"):
+            return jsonify({"error": "Unsupported export format."}), 400
+
+        # The connection stays checked out while the response streams and is released once it is closed
+        try:
+            connection = db_pool.connect()
+        except Exception as e:
+            print(f"Error starting students export: {e}")
+            flash("An error occurred while exporting student data.", "error")
+            return redirect(url_for("students"))
+        rows = roster.stream_results(connection)
+
+        if export_format == "csv":
+            body, mimetype = roster.csv_chunks(rows), "text/csv"
+        else:
+            body, mimetype = roster.ndjson_chunks(rows), "application/x-ndjson"
+        response = Response(
+            body,
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": f"attachment; filename=student_results.{export_format}"
+            },
+        )
+        # Stops the server-side cursor if the client goes away, and covers a body never iterated
+        response.call_on_close(rows.close)
+        response.call_on_close(connection.close)
+        return response
+
+    else:
+        flash("You need to log in with a teacher account to access this page!", "error")
+        return redirect(url_for("login"))
+
+
+def answer_feedback(key, correct: bool) -> str:
+    """
+    Builds the feedback message for a graded question from its chapter and sub-chapter.
+    """
+    if correct:
+        if key.chapter_name != key.subchapter:
+            return f"Right answer, great job! This question was from chapter: {key.chapter_name} and sub-chapter: {key.subchapter}."
+        return f"Right answer, great job! This question was from chapter: {key.chapter_name}."
+    if key.chapter_name != key.subchapter:
+        return f"Wrong answer! Please re-study the chapter: {key.chapter_name} and especially the sub-chapter: {key.subchapter}."
+    return f"Wrong answer! Please re-study the chapter: {key.chapter_name}."
+
+
 @app.route("/rightanswer", methods=["POST"])
 def rightanswer():
     """
-    Checks the provided answer against the correct answer from the database and provides feedback.
+    Checks the provided answer against the correct answer from the answer-key index and provides feedback.
     """
     if "username" in session and request.method == "POST":
         question_id = request.form.get("question")
@@ -699,40 +1172,13 @@ def rightanswer():
             return jsonify({"error": "Missing required fields."})
 
         try:
-            with mysql.connect() as connection:
-                with connection.cursor() as cursor:
-                    if test_type == "levels":
-                        query = """
-                            SELECT right_answer, chapter_name, subchapter
-                            FROM level_test
-                            WHERE test_id = %s
-                        """
-                    else:
-                        query = """
-                            SELECT right_answer, chapter_name, subchapter
-                            FROM tests_questions
-                            WHERE test_id = %s
-                        """
-                    cursor.execute(query, (question_id,))
-                    right_answer_data = cursor.fetchone()
-
-            if right_answer_data:
-                correct_answer, chapter_name, subchapter = right_answer_data
-                normalized_correct_answer = correct_answer.strip().lower()
-                normalized_user_answer = answer.strip().lower()
-
-                if normalized_correct_answer == normalized_user_answer:
-                    if chapter_name != subchapter:
-                        message = f"Right answer, great job! This question was from chapter: {chapter_name} and sub-chapter: {subchapter}."
-                    else:
-                        message = f"Right answer, great job! This question was from chapter: {chapter_name}."
-                    return jsonify({"success": message})
+            key = answer_keys.get(bank_for(test_type), question_id)
+
+            if key:
+                if key.answer == normalize_answer(answer):
+                    return jsonify({"success": answer_feedback(key, True)})
                 else:
-                    if chapter_name != subchapter:
-                        message = f"Wrong answer! Please re-study the chapter: {chapter_name} and especially the sub-chapter: {subchapter}."
-                    else:
-                        message = f"Wrong answer! Please re-study the chapter: {chapter_name}."
-                    return jsonify({"false": message})
+                    return jsonify({"false": answer_feedback(key, False)})
             else:
                 return jsonify({"error": "No question found with the provided ID."})
 
@@ -757,135 +1203,208 @@ def format_test_name(test: str) -> str:
     )
 
 
+def placement_message() -> str:
+    """
+    Invites the user to take the level test, with the score range of each level from LEVEL_TIERS.
+    """
+    tiers = app.config["LEVEL_TIERS"]
+    bounds = [("beginner", 0.0)] + tiers
+    ranges = []
+    for index, (level, minimum) in enumerate(bounds):
+        maximum = bounds[index + 1][1] - 1 if index + 1 < len(bounds) else 100
+        article = "an" if level[:1] in "aeiou" else "a"
+        ranges.append(f"If you score {minimum:g}% to {maximum:g}%, you will be assigned as {article} {level}.")
+    return (
+        "Wanna take a test to determine your level and possibly skip a couple of chapters? "
+        + " ".join(ranges)
+    )
+
+
 def get_level_info(score: float):
     """
     Determines the user's level, chapters, and tests based on their score.
     Returns the level description, chapters list, and tests list.
     """
-    if score < 40:
+    tiers = app.config["LEVEL_TIERS"]
+    tier = sum(score >= minimum for _, minimum in tiers)
+    if tier == 0:
         return "beginner", [], []
-    elif score < 70:
-        return (
-            "intermediate",
-            ["Quickstart", "Chapter1", "Chapter2", "Chapter3", "BasicsTest"],
-            [
-                "Quickstart_test",
-                "Chapter1_test",
-                "Chapter2_test",
-                "Chapter3_test",
-                "BasicsTest_test",
-            ],
-        )
-    else:
-        return (
-            "expert",
-            [
-                "Quickstart",
-                "Chapter1",
-                "Chapter2",
-                "Chapter3",
-                "BasicsTest",
-                "Chapter4",
-                "Chapter5",
-                "Chapter6",
-                "AdvancedTest",
-            ],
-            [
-                "Quickstart_test",
-                "Chapter1_test",
-                "Chapter2_test",
-                "Chapter3_test",
-                "BasicsTest_test",
-                "Chapter4_test",
-                "Chapter5_test",
-                "Chapter6_test",
-                "AdvancedTest_test",
-            ],
+
+    curriculum = catalog.get()
+    sections = curriculum.sections - 1 if tier == len(tiers) else tier
+    # Only reached if the curriculum lost sections since check_level_tiers() ran
+    sections = min(sections, curriculum.sections - 1)
+    if sections <= 0:
+        return tiers[tier - 1][0], [], []
+    chapters, tests = curriculum.through_section(sections)
+    return tiers[tier - 1][0], chapters, tests
+
+
+def check_level_tiers(curriculum):
+    """
+    Rejects LEVEL_TIERS that would give two levels the same grant: every tier needs a section
+    of its own below the last one, which placement never grants.
+    """
+    tiers = app.config["LEVEL_TIERS"]
+    if len(tiers) >= curriculum.sections:
+        raise ValueError(
+            f"LEVEL_TIERS has {len(tiers)} tiers but the curriculum only has {curriculum.sections} "
+            f"sections; use at most {curriculum.sections - 1} tiers."
         )
 
 
 def insert_chapters_tests(cursor, chapters: list, tests: list):
     """
-    Inserts chapters and tests for the user in the database.
+    Inserts chapters and tests for the user in the database, with one multi-row INSERT per
+    table so placement takes the same number of statements however long the curriculum is.
     """
-    for chapter in chapters:
+    if chapters:
         cursor.execute(
-            "INSERT INTO chapters_users_info (user_id, chapter_name) VALUES (%s, %s)",
-            (session["id"], chapter),
+            "INSERT INTO chapters_users_info (user_id, chapter_name) VALUES "
+            + ", ".join(["(%s, %s)"] * len(chapters)),
+            [value for chapter in chapters for value in (session["id"], chapter)],
         )
-    for test in tests:
+    if tests:
         cursor.execute(
-            "INSERT INTO tests_users_info (user_id, test_name, score) VALUES (%s, %s, %s)",
-            (session["id"], test, float(100)),
+            "INSERT INTO tests_users_info (user_id, test_name, score) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(tests)),
+            [value for test in tests for value in (session["id"], test, float(100))],
         )
+
+    # Count the granted tests as passed and advance the user's high-water marks past them
+    curriculum = catalog.get()
+    update_student_stats(
+        cursor,
+        len(tests),
+        float(100) * len(tests),
+        len(tests),
+        max_chapter_id=max((curriculum.chapter_ids[chapter] for chapter in chapters), default=0),
+        max_test_id=max((curriculum.test_ids[test] for test in tests), default=0),
+    )
     print("Chapters and tests inserted for user %s", session["id"])
 
 
-@app.route("/submitanswer", methods=["POST"])
-def submitanswer():
+def update_student_stats(
+    cursor, tests_passed: int, score_sum: float, score_count: int, max_chapter_id=0, max_test_id=0
+):
     """
-    Handles test submissions and updates user levels and test results in the database based on the score.
+    Adds newly recorded test results to the user's row in student_stats, the per-student
+    summary read by the /students roster, and raises the user's high-water marks to the
+    given ids. Runs in the same transaction as the results.
     """
-    if request.method == "POST":
-        if "username" in session:
+    # ROUND matches the rounding MySQL applies when the score is stored in the int column
+    cursor.execute(
+        "INSERT INTO student_stats (user_id, tests_passed, score_sum, score_count, "
+        "max_chapter_id, max_test_id, last_activity) "
+        "VALUES (%s, %s, ROUND(%s), %s, %s, %s, NOW(6)) "
+        "ON DUPLICATE KEY UPDATE tests_passed = tests_passed + VALUES(tests_passed), "
+        "score_sum = score_sum + VALUES(score_sum), "
+        "score_count = score_count + VALUES(score_count), "
+        "max_chapter_id = GREATEST(max_chapter_id, VALUES(max_chapter_id)), "
+        "max_test_id = GREATEST(max_test_id, VALUES(max_test_id)), "
+        "last_activity = VALUES(last_activity)",
+        (session["id"], tests_passed, score_sum, score_count, max_chapter_id, max_test_id),
+    )
 
-            # Validate and extract form data
-            score = request.form.get("score", type=float)
-            test = request.form.get("test")
 
-            # Validate score
-            if score is None or not isinstance(score, (float, int)):
-                print("Invalid score provided")
-                return jsonify({"error": "Invalid score"})
+def record_test_result(cursor, test: str, score: float) -> dict:
+    """
+    Records the outcome of a finished test (level placement or chapter test) and
+    returns the JSON payload describing it. The caller commits the transaction
+    before responding, so the new progress version only reaches the client once committed.
+    """
+    if test == "levels":
+        level_info, chapters, tests = get_level_info(score)
+        cursor.execute(
+            "insert into levels (user_id,level_test) values(%s,%s)",
+            (session["id"], "finished"),
+        )
+        insert_chapters_tests(cursor, chapters, tests)
+        progress_changed()
+        return {"info": f"You were set to be a {level_info} because you scored {score}%."}
 
-            try:
-                with mysql.connect() as connection:
-                    with connection.cursor() as cursor:
-                        if test == "levels":
-                            level_info, chapters, tests = get_level_info(score)
-                            if level_info:
-                                cursor.execute(
-                                    "insert into levels (user_id,level_test) values(%s,%s)",
-                                    (session["id"], "finished"),
-                                )
-                                insert_chapters_tests(cursor, chapters, tests)
-                                connection.commit()
-                                return jsonify(
-                                    {
-                                        "info": f"You were set to be a {level_info} because you scored {score}%."
-                                    }
-                                )
+    if score >= 60:
+        test_id = catalog.get().test_ids.get(test)
+        if test_id is None:
+            return {"error": "The selected test does not exist."}
 
-                        else:
-                            if score >= 60:
-                                cursor.execute(
-                                    "insert into tests_users_info (user_id,test_name,score) values(%s,%s,%s)",
-                                    (session["id"], test, float(score)),
-                                )
-                                connection.commit()
-                                return jsonify(
-                                    {
-                                        "success": f"You passed the {format_test_name(test)} with a score of {score}%."
-                                    }
-                                )
-                            else:
-                                return jsonify(
-                                    {
-                                        "error": f"You failed the {format_test_name(test)} with a score of {score}%. You must score over 60% to pass. Try again later."
-                                    }
-                                )
-            except Exception as e:
-                print("Error processing the test submission: %s", str(e))
-                return jsonify(
-                    {"error": "An error occurred processing your submission."}
-                )
-        else:
-            # Redirect to login if user is not logged in or is a teacher
-            flash(
-                "You need to log in or create an account to access our learning materials!",
-                "info",
+        # Passing advances the highest passed test only if this is the next one, in one
+        # conditional write that also updates the aggregates. A double-submit matches no row.
+        cursor.execute(
+            "UPDATE student_stats SET max_test_id = %s, tests_passed = tests_passed + 1, "
+            "score_sum = score_sum + ROUND(%s), score_count = score_count + 1, last_activity = NOW(6) "
+            "WHERE user_id = %s AND max_test_id = %s",
+            (test_id, score, session["id"], test_id - 1),
+        )
+        if cursor.rowcount != 1:
+            return {"error": "You must complete the previous tests before submitting this one."}
+
+        cursor.execute(
+            "insert into tests_users_info (user_id,test_name,score) values(%s,%s,%s)",
+            (session["id"], test, float(score)),
+        )
+        progress_changed()
+        return {
+            "success": f"You passed the {format_test_name(test)} with a score of {score}%."
+        }
+    return {
+        "error": f"You failed the {format_test_name(test)} with a score of {score}%. You must score over 60% to pass. Try again later."
+    }
+
+
+@app.route("/gradetest", methods=["POST"])
+def gradetest():
+    """
+    Grades all answers of the test served to the user in a single pass, records the
+    server-computed score in one transaction and returns per-question feedback.
+    Expects a JSON body: {"test": <test name>, "answers": {<question id>: <answer>}}.
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized access."})
+
+    payload = request.get_json(silent=True) or {}
+    test = payload.get("test")
+    answers = payload.get("answers")
+    if not test or not isinstance(answers, dict):
+        return jsonify({"error": "Missing required fields."})
+
+    # Only the questions actually served for this test are graded
+    served = session.get("served_test")
+    if not served or served["test"] != test:
+        return jsonify({"error": "This test has not been served to you. Please reload it."})
+
+    try:
+        bank = bank_for(test)
+        results = []
+        for question_id in served["questions"]:
+            key = answer_keys.get(bank, question_id)
+            if key is None:
+                continue
+            answer = answers.get(str(question_id))
+            correct = answer is not None and key.answer == normalize_answer(str(answer))
+            results.append(
+                {
+                    "question": question_id,
+                    "correct": correct,
+                    "feedback": answer_feedback(key, correct),
+                }
             )
-            return redirect(url_for("login"))
+
+        right = sum(1 for result in results if result["correct"])
+        score = round(right / len(results) * 100, 2) if results else 0.0
+
+        with db_pool.connect() as connection:
+            with connection.cursor() as cursor:
+                outcome = record_test_result(cursor, test, score)
+                connection.commit()
+    except Exception as e:
+        print(f"Error grading the test submission: {e}")
+        return jsonify({"error": "An error occurred processing your submission."})
+
+    # A served test can only be graded once
+    session.pop("served_test", None)
+    outcome.update({"score": score, "results": results})
+    return jsonify(outcome)
 
 
 @app.route("/leveltest", methods=["POST"])
@@ -898,8 +1417,11 @@ def level_test():
         if "username" in session:
             try:
                 if request.form.get("answer") == "no":
+                    # Progress before the write, usually still cached from the chapters page
+                    progress = current_progress()
+
                     # Establish a connection to the database
-                    with mysql.connect() as connection:
+                    with db_pool.connect() as connection:
                         with connection.cursor() as cursor:
                             # Update user's level to 'cancel'
                             cursor.execute(
@@ -907,30 +1429,15 @@ def level_test():
                                 (session["id"], "cancel"),
                             )
                             connection.commit()
+                    progress_changed()
 
-                            # Fetch user's progress (completed chapters and tests)
-                            cursor.execute(
-                                "SELECT chapter_name FROM chapters_users_info WHERE user_id=%s",
-                                (session["id"],),
-                            )
-                            chapters = cursor.fetchall()
-                            completed_chapters = [chapter[0] for chapter in chapters]
+                    # Setting the level does not change completed chapters and tests
+                    completed_chapters = list(progress.chapters)
+                    completed_tests = progress.passed_tests()
 
-                            cursor.execute(
-                                "select tests.test_name,score from tests inner join tests_users_info on tests.test_name=tests_users_info.test_name where user_id=%s and score>50 order by tests.id",
-                                (session["id"]),
-                            )
-                            tests = cursor.fetchall()
-                            completed_tests = [test[0] for test in tests]
-
-                            cursor.execute(
-                                "select chapter_name from chapters order by id"
-                            )
-                            chapters = cursor.fetchall()
-                            all_chapters = [chapter[0] for chapter in chapters]
-                            cursor.execute("select test_name from tests order by id")
-                            tests = cursor.fetchall()
-                            all_tests = [test[0] for test in tests]
+                    curriculum = catalog.get()
+                    all_chapters = list(curriculum.chapters)
+                    all_tests = list(curriculum.tests)
 
                     # Return the response as a JSON object
                     return jsonify(
@@ -957,5 +1464,152 @@ def level_test():
     return jsonify({"error": "Invalid request method."}), 405
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Exposes the metrics of this worker process to a Prometheus scraper."""
+    token = app.config["METRICS_TOKEN"]
+    if not token:
+        return not_found(None)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        response = Response("Unauthorized\n", status=401, mimetype="text/plain")
+        response.headers["WWW-Authenticate"] = 'Bearer realm="metrics"'
+        return response
+    response = Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+    response.cache_control.no_store = True
+    return response
+
+
+def warm_up():
+    """
+    Loads what the first requests would otherwise pay for: the curriculum, both question
+    banks, the rendered chapter fragments and the pool's min_size connections. Failures are
+    only logged; the caches then fill lazily as before. A LEVEL_TIERS setting that does not
+    fit the curriculum stops the app.
+    """
+    try:
+        curriculum = catalog.get()
+        answer_keys.load()
+        question_index.load()
+        with app.test_request_context():
+            chapter_content_versions()
+        db_pool.prefill()
+    except Exception as e:
+        print(f"Error warming up: {e}")
+        return
+    check_level_tiers(curriculum)
+
+
+def create_app(warm=True):
+    """
+    Returns the configured application for WSGI servers (see wsgi.py), warmed up first.
+    Configuration is read once, when this module is imported. Under gunicorn's preload_app
+    that happens in the master, so every forked worker starts with the caches loaded.
+    """
+    if warm:
+        warm_up()
+    return app
+
+
+@app.route("/profiling", methods=["POST"])
+def toggle_profiling():
+    """
+    Turns profiling of every request of the current session on or off, for teacher accounts.
+    Form field: enabled (1 or 0).
+    """
+    if "username" not in session or "teacher" not in session:
+        return jsonify({"error": "Unauthorized request."}), 403
+    if not request_profiler.enabled:
+        return jsonify({"error": "Profiling is not enabled on this server."}), 400
+
+    enabled = request.form.get("enabled") in ("1", "true", "on")
+    if enabled:
+        session[profiling.SESSION_KEY] = True
+    else:
+        session.pop(profiling.SESSION_KEY, None)
+    state = "on" if enabled else "off"
+    return jsonify({"success": f"Profiling of your requests is {state}."})
+
+
+def explained_queries() -> list:
+    """
+    The app's read queries as (label, sql, representative params), for `migrate --explain`.
+    The SQL is the routes' own, so the plans shown are those of the statements actually run.
+    """
+    page_sql, page_params = roster.page_query("average", True, after=(80, 1), size=50)
+    return [
+        ("login", LOGIN_QUERY, ("student@example.com",)),
+        ("signup.exists", EXISTING_USER_QUERY, ("student", "student@example.com")),
+        ("signup.user_id", USER_ID_QUERY, ("student",)),
+        ("progress", PROGRESS_QUERY, (1, 1, 1, 1)),
+        ("tests.questions", questions_query(3), (1, 2, 3)),
+        ("question_index", QUESTION_IDS_QUERY, ()),
+        ("students.page", page_sql, page_params),
+        ("students.version", roster.VERSION_QUERY, ()),
+        ("students.scores", roster.scores_query(2), (1, 2)),
+        ("catalog.chapters", CHAPTERS_QUERY, ()),
+        ("catalog.tests", TESTS_QUERY, ()),
+        ("answer_keys.tests", ANSWER_KEY_QUERY.format(table="tests_questions"), (1,)),
+    ]
+
+
+@app.cli.command("migrate")
+@click.option(
+    "--explain", is_flag=True, help="Print EXPLAIN plans of the app's queries before and after."
+)
+def migrate_command(explain):
+    """Applies pending schema migrations (flask --app main migrate)."""
+    with mysql.connect() as connection:
+        queries = explained_queries()
+        before = migrations.explain_queries(connection, queries) if explain else None
+        applied = migrations.apply_migrations(connection, log=click.echo)
+        if not applied:
+            click.echo("The database schema is up to date.")
+        if explain:
+            after = migrations.explain_queries(connection, queries)
+            click.echo(migrations.format_plan_comparison(before, after))
+
+
+@app.cli.command("import-questions")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "json"]), help="Defaults to the file extension.")
+@click.option("--dry-run", is_flag=True, help="Only validate the file, write nothing.")
+def import_questions_command(path, file_format, dry_run):
+    """Bulk imports questions from a CSV or JSON file (flask --app main import-questions FILE)."""
+    with open(path, "rb") as file:
+        data = file.read()
+    try:
+        rows = question_import.parse_rows(data, file_format or question_import.format_for(path))
+    except question_import.ImportFormatError as e:
+        raise click.ClickException(str(e))
+
+    report = run_question_import(rows, dry_run=dry_run)
+    for row, message in report.errors:
+        click.echo(f"row {row}: {message}", err=True)
+    if report.errors:
+        raise click.ClickException("Nothing was imported.")
+    if report.dry_run:
+        click.echo(f"All {report.imported} question(s) are valid.")
+    else:
+        click.echo(f"Imported {report.imported} question(s).")
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Writes fingerprinted and gzipped copies of the static files (flask --app main build-assets)."""
+    manifest = assets.build(app.static_folder, log=click.echo)
+    click.echo(f"{len(manifest)} assets in {assets.DIST_DIR}/{assets.MANIFEST_NAME}.")
+
+
+@app.cli.command("profile-token")
+def profile_token_command():
+    """Prints a signed X-Profile header value (flask --app main profile-token)."""
+    if not request_profiler.enabled:
+        raise click.ClickException("Set PROFILE_DIR to enable request profiling.")
+    max_age = app.config["PROFILE_TOKEN_MAX_AGE"]
+    click.echo(f"{profiling.HEADER}: {request_profiler.make_token()}")
+    click.echo(f"Valid for {max_age} seconds.", err=True)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,210 @@
+# Request, query and connection pool metrics in the Prometheus text format.
+#
+# Metrics live in the memory of each process. Under gunicorn every series carries a
+# `worker` label (the pid), so aggregate across workers with e.g. sum without (worker).
+import bisect
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import g, request
+
+# Latency buckets in seconds, from a cached page to a slow export.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Short, low-cardinality label for a statement: its verb and first table."""
+    words = sql.split(None, 1)
+    verb = words[0].upper() if words else "?"
+    if verb == "EXPLAIN" and len(words) > 1:
+        return "EXPLAIN " + statement_label(words[1])
+    table = SQL_TABLE.search(sql)
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, constant_labels):
+        lines = self._header()
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels, constant_labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels=(), value=0.0):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self, constant_labels):
+        lines = self._header()
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    self.labelnames, labels, list(constant_labels) + [("le", bound)]
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series = _format_labels(self.labelnames, labels, constant_labels)
+            lines.append(f"{self.name}_sum{series} {total}")
+            lines.append(f"{self.name}_count{series} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Records per-endpoint latency, status and in-flight requests, every statement run on
+    the connection pool (count, total time and rows per statement label) and the time
+    spent waiting for a pooled connection.
+    """
+
+    def __init__(self, app=None, pool=None, prefix="pythonista"):
+        self.prefix = prefix
+        self.requests = Counter(
+            f"{prefix}_http_requests_total", "HTTP requests by endpoint, method and status.",
+            ("endpoint", "method", "status"),
+        )
+        self.latency = Histogram(
+            f"{prefix}_http_request_duration_seconds", "HTTP request latency by endpoint.",
+            ("endpoint", "method"),
+        )
+        self.in_flight = Gauge(
+            f"{prefix}_http_requests_in_flight", "Requests being processed, by endpoint.",
+            ("endpoint",),
+        )
+        self.queries = Counter(
+            f"{prefix}_db_queries_total", "SQL statements executed, by statement.", ("statement",)
+        )
+        self.query_seconds = Counter(
+            f"{prefix}_db_query_seconds_total", "Time spent executing SQL statements, by statement.",
+            ("statement",),
+        )
+        self.query_rows = Counter(
+            f"{prefix}_db_query_rows_total", "Rows returned or affected, by statement.", ("statement",)
+        )
+        self.pool_wait = Histogram(
+            f"{prefix}_db_pool_wait_seconds", "Time spent waiting to check out a pooled connection.",
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+        )
+        self.pool_connections = Gauge(
+            f"{prefix}_db_pool_connections", "Open pooled connections by state.", ("state",)
+        )
+        self._metrics = [
+            self.requests,
+            self.latency,
+            self.in_flight,
+            self.queries,
+            self.query_seconds,
+            self.query_rows,
+            self.pool_wait,
+            self.pool_connections,
+        ]
+        self.pool = None
+        if app is not None:
+            self.init_app(app, pool)
+
+    def init_app(self, app, pool=None):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if pool is not None:
+            self.pool = pool
+            pool.query_listeners.append(self.record_query)
+            pool.checkout_listeners.append(lambda waited: self.pool_wait.observe((), waited))
+
+    def record_query(self, sql, args, elapsed, rowcount):
+        label = (statement_label(sql),)
+        self.queries.inc(label)
+        self.query_seconds.inc(label, elapsed)
+        self.query_rows.inc(label, rowcount)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or "unmatched"
+        self.in_flight.inc((g.metrics_endpoint,))
+
+    def _after_request(self, response):
+        started = g.get("metrics_started")
+        if started is not None:
+            endpoint = g.metrics_endpoint
+            self.latency.observe((endpoint, request.method), time.perf_counter() - started)
+            self.requests.inc((endpoint, request.method, str(response.status_code)))
+        return response
+
+    def _teardown_request(self, exc):
+        endpoint = g.pop("metrics_endpoint", None)
+        if endpoint is not None:
+            self.in_flight.dec((endpoint,))
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        if self.pool is not None:
+            stats = self.pool.stats()
+            self.pool_connections.set(("idle",), stats["idle"])
+            self.pool_connections.set(("in_use",), stats["in_use"])
+        constant_labels = [("worker", os.getpid())]
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(constant_labels))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,260 @@
+# Versioned schema migrations for the pythonista database.
+#
+# Each migration is applied once, in order, and recorded in `schema_migrations`. The steps
+# themselves are idempotent too (they check information_schema first), so a database created
+# from an up-to-date pythonista.sql dump simply gets every version marked as applied.
+from collections import namedtuple
+
+import pymysql
+
+Migration = namedtuple("Migration", ["version", "name", "steps"])
+
+
+def add_column(table: str, column: str, definition: str):
+    """Step that adds a column unless it already exists."""
+
+    def step(cursor):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+            (table, column),
+        )
+        if cursor.fetchone()[0]:
+            return f"column {table}.{column} already exists"
+        cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+        return f"added column {table}.{column}"
+
+    return step
+
+
+def modify_column(table: str, column: str, definition: str):
+    """Step that redefines a column. MODIFY COLUMN is naturally idempotent."""
+
+    def step(cursor):
+        cursor.execute(f"ALTER TABLE `{table}` MODIFY COLUMN `{column}` {definition}")
+        return f"modified column {table}.{column}"
+
+    return step
+
+
+def add_index(table: str, name: str, columns: list, unique: bool = False):
+    """Step that creates an index unless one with the same name already exists."""
+
+    def step(cursor):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+            (table, name),
+        )
+        if cursor.fetchone()[0]:
+            return f"index {table}.{name} already exists"
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        column_list = ", ".join(f"`{column}`" for column in columns)
+        cursor.execute(f"CREATE {kind} `{name}` ON `{table}` ({column_list})")
+        return f"created {kind.lower()} {table}.{name}"
+
+    return step
+
+
+def create_table(table: str, definition: str):
+    """Step that creates a table unless it already exists."""
+
+    def step(cursor):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s",
+            (table,),
+        )
+        if cursor.fetchone()[0]:
+            return f"table {table} already exists"
+        cursor.execute(f"CREATE TABLE `{table}` ({definition})")
+        return f"created table {table}"
+
+    return step
+
+
+def run_sql(description: str, sql: str):
+    """Step that runs a statement which is idempotent on its own (e.g. an upsert)."""
+
+    def step(cursor):
+        cursor.execute(sql)
+        return description
+
+    return step
+
+
+# Ordered list of every migration. Append new ones with the next version number; never edit
+# or reorder migrations that have already shipped.
+MIGRATIONS = [
+    Migration(
+        1,
+        "per-user KDF parameters",
+        [
+            modify_column("users_info", "password", "varchar(128) NOT NULL"),
+            add_column("users_info", "kdf_algorithm", "varchar(16) NOT NULL DEFAULT 'sha256'"),
+            add_column("users_info", "kdf_iterations", "int NOT NULL DEFAULT '10000'"),
+        ],
+    ),
+    Migration(
+        2,
+        "indexes for login, signup, tests and progress joins",
+        [
+            add_index("users_info", "uq_users_info_email", ["email"], unique=True),
+            add_index("users_info", "uq_users_info_username", ["username"], unique=True),
+            add_index("chapters", "uq_chapters_id", ["id"], unique=True),
+            add_index("tests", "uq_tests_id", ["id"], unique=True),
+            add_index("tests_questions", "ix_tests_questions_test_name", ["test_name"]),
+            add_index("chapters_users_info", "ix_chapters_users_info_chapter_name", ["chapter_name"]),
+            add_index("tests_users_info", "ix_tests_users_info_test_name", ["test_name"]),
+        ],
+    ),
+    Migration(
+        3,
+        "materialized per-student score aggregates",
+        [
+            create_table(
+                "student_stats",
+                "`user_id` int NOT NULL, "
+                "`tests_passed` int NOT NULL DEFAULT '0', "
+                "`score_sum` int NOT NULL DEFAULT '0', "
+                "`score_count` int NOT NULL DEFAULT '0', "
+                "`last_activity` datetime DEFAULT NULL, "
+                "PRIMARY KEY (`user_id`)",
+            ),
+            run_sql(
+                "backfilled student_stats from tests_users_info",
+                "INSERT INTO student_stats (user_id, tests_passed, score_sum, score_count, last_activity) "
+                "SELECT user_id, SUM(score >= 60), COALESCE(SUM(score), 0), COUNT(score), NOW() "
+                "FROM tests_users_info GROUP BY user_id "
+                "ON DUPLICATE KEY UPDATE tests_passed = VALUES(tests_passed), "
+                "score_sum = VALUES(score_sum), score_count = VALUES(score_count)",
+            ),
+        ],
+    ),
+    Migration(
+        4,
+        "sortable, keyset-paginated student roster",
+        [
+            add_column(
+                "student_stats",
+                "average_score",
+                "decimal(6,2) GENERATED ALWAYS AS "
+                "(IF(score_count = 0, 0, score_sum / score_count)) STORED NOT NULL",
+            ),
+            add_index("student_stats", "ix_student_stats_average_score", ["average_score"]),
+            add_index("student_stats", "ix_student_stats_tests_passed", ["tests_passed"]),
+            run_sql(
+                "added student_stats rows for students without results",
+                "INSERT IGNORE INTO student_stats (user_id) SELECT user_id FROM users_info",
+            ),
+        ],
+    ),
+    Migration(
+        5,
+        "per-user progress high-water marks",
+        [
+            add_column("student_stats", "max_chapter_id", "int NOT NULL DEFAULT '0'"),
+            add_column("student_stats", "max_test_id", "int NOT NULL DEFAULT '0'"),
+            run_sql(
+                "backfilled high-water marks from chapters_users_info and tests_users_info",
+                "UPDATE student_stats SET "
+                "max_chapter_id = COALESCE((SELECT MAX(chapters.id) FROM chapters_users_info "
+                "INNER JOIN chapters ON chapters.chapter_name = chapters_users_info.chapter_name "
+                "WHERE chapters_users_info.user_id = student_stats.user_id), 0), "
+                "max_test_id = COALESCE((SELECT MAX(tests.id) FROM tests_users_info "
+                "INNER JOIN tests ON tests.test_name = tests_users_info.test_name "
+                "WHERE tests_users_info.user_id = student_stats.user_id), 0)",
+            ),
+        ],
+    ),
+    Migration(
+        6,
+        "roster version from the latest student activity",
+        [
+            modify_column("student_stats", "last_activity", "datetime(6) DEFAULT NULL"),
+            add_index("student_stats", "ix_student_stats_last_activity", ["last_activity"]),
+        ],
+    ),
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version int NOT NULL, "
+        "name varchar(100) NOT NULL, "
+        "applied_at datetime NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (version))"
+    )
+
+
+def applied_versions(cursor) -> set:
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor) -> list:
+    """Returns the migrations that have not been applied yet, in order."""
+    applied = applied_versions(cursor)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def apply_migrations(connection, log=print) -> list:
+    """
+    Applies every pending migration in order and returns the versions applied.
+    MySQL commits DDL implicitly, so a migration is recorded only after all its steps succeed;
+    a failed migration is simply retried (its finished steps are skipped) on the next run.
+    """
+    applied = []
+    with connection.cursor() as cursor:
+        for migration in pending_migrations(cursor):
+            log(f"Applying migration {migration.version}: {migration.name}")
+            for step in migration.steps:
+                log(f"  {step(cursor)}")
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+            connection.commit()
+            applied.append(migration.version)
+    return applied
+
+
+def explain_queries(connection, queries) -> dict:
+    """
+    Runs EXPLAIN for each (label, sql, params) in queries and returns {label: plan}, where a
+    plan is a list of rows as dicts, or the error message for a query the current schema
+    cannot run yet (e.g. one using a column a pending migration adds).
+    """
+    plans = {}
+    with connection.cursor() as cursor:
+        for label, sql, params in queries:
+            try:
+                cursor.execute("EXPLAIN " + sql, params)
+            except pymysql.MySQLError as e:
+                plans[label] = str(e)
+                continue
+            columns = [column[0] for column in cursor.description]
+            plans[label] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return plans
+
+
+def summarize_plan(plan: list) -> str:
+    """One-line summary of an EXPLAIN result: access type, key and estimated rows per table."""
+    if isinstance(plan, str):
+        return f"not explainable: {plan}"
+    return "; ".join(
+        f"{row.get('table')}: {row.get('type')} key={row.get('key')} rows={row.get('rows')}"
+        for row in plan
+    )
+
+
+def format_plan_comparison(before: dict, after: dict) -> str:
+    """Renders the before/after EXPLAIN summaries of every query, one block per query."""
+    lines = []
+    for label in after:
+        lines.append(label)
+        lines.append(f"  before: {summarize_plan(before.get(label, []))}")
+        lines.append(f"  after:  {summarize_plan(after.get(label, []))}")
+    return "\n".join(lines)
@@ -0,0 +1,303 @@
+# A small, thread-safe pool of PyMySQL connections shared by every route in main.py.
+import os
+import threading
+import time
+from collections import deque
+
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the acquire timeout."""
+
+
+class TimedCursor:
+    """
+    Cursor proxy that reports every statement to the pool's query listeners as
+    (sql, args, elapsed seconds, rowcount), whether it succeeded or raised.
+    """
+
+    def __init__(self, cursor, listeners):
+        self._cursor = cursor
+        self._listeners = listeners
+
+    def _report(self, query, args, started):
+        elapsed = time.perf_counter() - started
+        rowcount = self._cursor.rowcount
+        # Unbuffered cursors do not know their row count when execute() returns
+        if rowcount is None or rowcount < 0 or rowcount >= 2**63:
+            rowcount = 0
+        for listener in self._listeners:
+            try:
+                listener(query, args, elapsed, rowcount)
+            except Exception as e:
+                print(f"Error in query listener: {e}")
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            self._report(query, args, started)
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            self._report(query, args, started)
+
+    def __getattr__(self, name):
+        # fetch*, rowcount, lastrowid, description, close, ... go to the real cursor.
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+class PooledConnection:
+    """
+    Thin wrapper handed out by the pool. It behaves like a PyMySQL connection
+    (cursor, commit, rollback, context manager) but close() gives the
+    connection back to the pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.query_listeners:
+            return TimedCursor(cursor, self._pool.query_listeners)
+        return cursor
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        """Returns the connection to the pool. Safe to call more than once."""
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self._created_at)
+
+    def __getattr__(self, name):
+        # Anything not wrapped above (ping, begin, server_status, ...) goes to the real connection.
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    connect: zero-argument callable returning a new PyMySQL connection.
+    min_size: connections kept open even when idle (see prefill()).
+    max_size: hard upper bound on open connections.
+    max_age: seconds after which a connection is retired instead of reused.
+    max_idle: seconds an idle connection above min_size is kept around.
+    ping_after: connections idle for longer than this are pinged on checkout.
+    timeout: seconds to wait for a free connection before raising PoolTimeout.
+
+    query_listeners: callables(sql, args, elapsed, rowcount) called after every statement
+    run on a pooled connection. Cursors are only wrapped while there is a listener.
+    checkout_listeners: callables(wait_seconds) called after every checkout.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size=1,
+        max_size=10,
+        max_age=3600,
+        max_idle=300,
+        ping_after=5,
+        timeout=10,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.timeout = timeout
+
+        self.query_listeners = []
+        self.checkout_listeners = []
+
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # Idle entries are (connection, created_at, returned_at); newest at the right.
+        self._idle = deque()
+        self._size = 0
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Sockets must not be shared across processes (e.g. gunicorn workers forked
+        # from a preloading master), so a child starts from an empty pool.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _open(self):
+        """Opens a new raw connection. Must be called after reserving a slot in _size."""
+        try:
+            return self._connect(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, raw):
+        """Closes a raw connection and frees its slot."""
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _healthy(self, raw, created_at, returned_at, now):
+        """Checks that an idle connection can be reused."""
+        if not raw.open or now - created_at > self.max_age:
+            return False
+        if now - returned_at > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def connect(self):
+        """
+        Checks out a connection, waiting up to the acquire timeout for one to be
+        released when the pool is at max_size.
+        """
+        started = time.monotonic()
+        connection = self._checkout(started + self.timeout)
+        if self.checkout_listeners:
+            waited = time.monotonic() - started
+            for listener in self.checkout_listeners:
+                try:
+                    listener(waited)
+                except Exception as e:
+                    print(f"Error in checkout listener: {e}")
+        return connection
+
+    def _checkout(self, deadline):
+        while True:
+            stale = []
+            entry = None
+            reserved = False
+            with self._cond:
+                self._check_fork()
+                while True:
+                    now = time.monotonic()
+                    # Retire idle connections that outlived max_idle while we are above min_size.
+                    while (
+                        self._idle
+                        and self._size - len(stale) > self.min_size
+                        and now - self._idle[0][2] > self.max_idle
+                    ):
+                        stale.append(self._idle.popleft()[0])
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size - len(stale) < self.max_size:
+                        self._size += 1
+                        reserved = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            for raw in stale:
+                self._discard(raw)
+
+            if reserved:
+                raw, created_at = self._open()
+                return PooledConnection(self, raw, created_at)
+
+            if entry is None:
+                raise PoolTimeout(
+                    f"Timed out after {self.timeout}s waiting for a database connection."
+                )
+
+            raw, created_at, returned_at = entry
+            if self._healthy(raw, created_at, returned_at, time.monotonic()):
+                return PooledConnection(self, raw, created_at)
+            # Broken or too old: drop it and try again with the time we have left.
+            self._discard(raw)
+
+    def _release(self, raw, created_at):
+        """Takes a connection back, ending any open transaction first."""
+        if self._pid != os.getpid():
+            return
+        try:
+            # Handlers that only read never commit, which would otherwise leave a
+            # REPEATABLE READ snapshot open across requests.
+            if raw.open and raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        if not raw.open or time.monotonic() - created_at > self.max_age:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            self._idle.append((raw, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def prefill(self):
+        """Opens connections until min_size are available, e.g. before serving traffic."""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            raw, created_at = self._open()
+            with self._cond:
+                self._idle.append((raw, created_at, time.monotonic()))
+                self._cond.notify()
+
+    def close(self):
+        """Closes every idle connection, e.g. on shutdown."""
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Returns a snapshot of the pool size for diagnostics."""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
@@ -0,0 +1,120 @@
+# On-demand cProfile profiling of single requests, written as pstats files per route.
+#
+# A request is profiled when PROFILE_DIR is set and one of these holds:
+#   - it carries an X-Profile header with a token from `flask --app main profile-token`,
+#   - the logged-in teacher turned profiling on for their session (POST /profiling),
+#   - it was sampled: one request in PROFILE_SAMPLE_RATE, if that is set.
+# Profiles land in PROFILE_DIR/<endpoint>/ and can be read with `python -m pstats FILE`.
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import g, request, session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+HEADER = "X-Profile"
+SESSION_KEY = "profiling"
+
+
+class RequestProfiler:
+    """
+    Profiles the view and after-request hooks of selected requests. Without PROFILE_DIR
+    no hook is registered, so requests pay nothing. One request per process is profiled
+    at a time (cProfile cannot run two profilers at once); others run unprofiled.
+
+    App config: PROFILE_DIR, PROFILE_SAMPLE_RATE (0 disables sampling) and
+    PROFILE_TOKEN_MAX_AGE (seconds a header token stays valid).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._busy = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILE_DIR", "")
+        app.config.setdefault("PROFILE_SAMPLE_RATE", 0)
+        app.config.setdefault("PROFILE_TOKEN_MAX_AGE", 3600)
+        self.app = app
+        if not app.config["PROFILE_DIR"]:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.app and self.app.config["PROFILE_DIR"])
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(self.app.secret_key, salt="request-profile")
+
+    def make_token(self) -> str:
+        """A signed token for the X-Profile header, valid for PROFILE_TOKEN_MAX_AGE seconds."""
+        return self._serializer().dumps("profile")
+
+    def _valid_token(self, token: str) -> bool:
+        try:
+            self._serializer().loads(token, max_age=self.app.config["PROFILE_TOKEN_MAX_AGE"])
+        except BadSignature:
+            return False
+        return True
+
+    def wanted(self) -> bool:
+        """Tells whether the current request should be profiled."""
+        token = request.headers.get(HEADER)
+        if token and self._valid_token(token):
+            return True
+        if session.get(SESSION_KEY) and "teacher" in session:
+            return True
+        rate = self.app.config["PROFILE_SAMPLE_RATE"]
+        return rate > 0 and random.random() < 1 / rate
+
+    def _before_request(self):
+        if request.endpoint == "static" or not self.wanted():
+            return
+        if not self._busy.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) is already active
+            self._busy.release()
+            return
+        g.request_profiler = profiler
+        g.request_profile_started = time.perf_counter()
+
+    def _after_request(self, response):
+        profiler = g.get("request_profiler")
+        if profiler is not None:
+            g.request_profile_name = self._profile_name()
+            response.headers[HEADER] = g.request_profile_name
+        return response
+
+    def _teardown_request(self, exc):
+        profiler = g.pop("request_profiler", None)
+        if profiler is None:
+            return
+        try:
+            profiler.disable()
+            name = g.get("request_profile_name") or self._profile_name()
+            path = os.path.join(self.app.config["PROFILE_DIR"], name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profiler.dump_stats(path)
+        except Exception as e:
+            print(f"Error writing the request profile: {e}")
+        finally:
+            self._busy.release()
+
+    def _profile_name(self) -> str:
+        """<endpoint>/<time>-<method>-<milliseconds>ms-<random>.prof"""
+        elapsed = (time.perf_counter() - g.request_profile_started) * 1000
+        return (
+            f"{request.endpoint or 'unmatched'}/"
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{elapsed:.0f}ms-{uuid.uuid4().hex[:8]}.prof"
+        )
@@ -0,0 +1,122 @@
+# Per-user progress (level status, completed chapters, passed tests) loaded with one query and cached.
+import threading
+import time
+from collections import OrderedDict
+
+# A user's whole progress in one round-trip; takes the user id four times.
+PROGRESS_QUERY = (
+    "SELECT 'level', level_test, NULL FROM levels WHERE user_id = %s "
+    "UNION ALL SELECT 'chapter', chapter_name, NULL FROM chapters_users_info WHERE user_id = %s "
+    "UNION ALL SELECT 'test', test_name, score FROM tests_users_info WHERE user_id = %s "
+    "UNION ALL SELECT 'marks', max_chapter_id, max_test_id FROM student_stats WHERE user_id = %s"
+)
+
+
+class UserProgress:
+    """
+    Snapshot of one user's progress.
+
+    level: the user's row in `levels` ("finished", "cancel") or None if they have not decided yet.
+    chapters: completed chapter names, in curriculum order.
+    tests: (test_name, score) pairs of recorded tests, in curriculum order.
+    version: the progress version the snapshot was loaded for.
+    max_chapter_id / max_test_id: catalog ids of the highest completed chapter and passed test.
+    """
+
+    def __init__(self, level, chapters, tests, version, max_chapter_id=0, max_test_id=0):
+        self.level = level
+        self.chapters = chapters
+        self.tests = tests
+        self.version = version
+        self.max_chapter_id = max_chapter_id
+        self.max_test_id = max_test_id
+        self.loaded_at = time.monotonic()
+
+    def passed_tests(self, min_score=50):
+        """Names of the tests scored above min_score, in curriculum order."""
+        return [name for name, score in self.tests if score is not None and score > min_score]
+
+    @property
+    def total_score(self):
+        return sum(int(score) for _, score in self.tests if score is not None)
+
+
+def load_progress(cursor, user_id, catalog_snapshot, version):
+    """Loads a user's whole progress with a single UNION query."""
+    cursor.execute(PROGRESS_QUERY, (user_id, user_id, user_id, user_id))
+    level = None
+    chapters = []
+    tests = []
+    max_chapter_id = max_test_id = 0
+    for kind, name, score in cursor.fetchall():
+        if kind == "level":
+            level = name
+        elif kind == "chapter":
+            chapters.append(name)
+        elif kind == "marks":
+            # The UNION widens the marks to the name column's type
+            max_chapter_id, max_test_id = int(name), int(score)
+        else:
+            tests.append((name, score))
+
+    # Curriculum order; names missing from the catalog go last
+    chapter_ids = catalog_snapshot.chapter_ids
+    test_ids = catalog_snapshot.test_ids
+    last = len(chapter_ids) + len(test_ids) + 1
+    chapters.sort(key=lambda name: chapter_ids.get(name, last))
+    tests.sort(key=lambda test: test_ids.get(test[0], last))
+    return UserProgress(
+        level, tuple(chapters), tuple(tests), version, max_chapter_id, max_test_id
+    )
+
+
+class ProgressCache:
+    """
+    Bounded LRU cache of UserProgress keyed by user id.
+
+    Every write to a user's progress happens in one of their own requests, which stores a new
+    progress version in their session. An entry is only served to a request carrying the
+    version it was loaded for, so a write seen by one worker is never hidden by another
+    worker's stale entry. The TTL bounds staleness across different sessions of one account.
+    """
+
+    def __init__(self, pool, catalog, ttl=300, max_entries=10000):
+        self._pool = pool
+        self._catalog = catalog
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        """Returns the user's progress, loading it with one query on a miss."""
+        with self._lock:
+            progress = self._entries.get(user_id)
+            if (
+                progress is not None
+                and progress.version == version
+                and time.monotonic() - progress.loaded_at <= self.ttl
+            ):
+                self._entries.move_to_end(user_id)
+                return progress
+
+        catalog_snapshot = self._catalog.get()
+        with self._pool.connect() as connection:
+            with connection.cursor() as cursor:
+                progress = load_progress(cursor, user_id, catalog_snapshot, version)
+
+        with self._lock:
+            self._entries[user_id] = progress
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return progress
+
+    def invalidate(self, user_id):
+        """Drops the cached progress of one user."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -25,7 +25,8 @@ DROP TABLE IF EXISTS `chapters`;
 CREATE TABLE `chapters` (
   `id` int NOT NULL,
   `chapter_name` varchar(45) NOT NULL,
-  PRIMARY KEY (`chapter_name`)
+  PRIMARY KEY (`chapter_name`),
+  UNIQUE KEY `uq_chapters_id` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -49,7 +50,8 @@ DROP TABLE IF EXISTS `chapters_users_info`;
 CREATE TABLE `chapters_users_info` (
   `user_id` int NOT NULL,
   `chapter_name` varchar(100) NOT NULL,
-  PRIMARY KEY (`user_id`,`chapter_name`)
+  PRIMARY KEY (`user_id`,`chapter_name`),
+  KEY `ix_chapters_users_info_chapter_name` (`chapter_name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -118,6 +120,38 @@ LOCK TABLES `levels` WRITE;
 /*!40000 ALTER TABLE `levels` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `student_stats`
+--
+
+DROP TABLE IF EXISTS `student_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `student_stats` (
+  `user_id` int NOT NULL,
+  `tests_passed` int NOT NULL DEFAULT '0',
+  `score_sum` int NOT NULL DEFAULT '0',
+  `score_count` int NOT NULL DEFAULT '0',
+  `last_activity` datetime(6) DEFAULT NULL,
+  `average_score` decimal(6,2) GENERATED ALWAYS AS (if((`score_count` = 0),0,(`score_sum` / `score_count`))) STORED NOT NULL,
+  `max_chapter_id` int NOT NULL DEFAULT '0',
+  `max_test_id` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_id`),
+  KEY `ix_student_stats_average_score` (`average_score`),
+  KEY `ix_student_stats_tests_passed` (`tests_passed`),
+  KEY `ix_student_stats_last_activity` (`last_activity`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `student_stats`
+--
+
+LOCK TABLES `student_stats` WRITE;
+/*!40000 ALTER TABLE `student_stats` DISABLE KEYS */;
+/*!40000 ALTER TABLE `student_stats` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `tests`
 --
@@ -128,7 +162,8 @@ DROP TABLE IF EXISTS `tests`;
 CREATE TABLE `tests` (
   `id` int NOT NULL,
   `test_name` varchar(45) NOT NULL,
-  PRIMARY KEY (`test_name`)
+  PRIMARY KEY (`test_name`),
+  UNIQUE KEY `uq_tests_id` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -161,7 +196,8 @@ CREATE TABLE `tests_questions` (
   `chapter_name` varchar(45) NOT NULL,
   `subchapter` varchar(100) NOT NULL,
   `test_id` int NOT NULL AUTO_INCREMENT,
-  PRIMARY KEY (`test_id`)
+  PRIMARY KEY (`test_id`),
+  KEY `ix_tests_questions_test_name` (`test_name`)
 ) ENGINE=InnoDB AUTO_INCREMENT=82 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -186,7 +222,8 @@ CREATE TABLE `tests_users_info` (
   `user_id` int NOT NULL,
   `test_name` varchar(100) NOT NULL,
   `score` int DEFAULT NULL,
-  PRIMARY KEY (`user_id`,`test_name`)
+  PRIMARY KEY (`user_id`,`test_name`),
+  KEY `ix_tests_users_info_test_name` (`test_name`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -209,12 +246,16 @@ DROP TABLE IF EXISTS `users_info`;
 CREATE TABLE `users_info` (
   `user_id` int NOT NULL AUTO_INCREMENT,
   `username` varchar(32) NOT NULL,
-  `password` varchar(64) NOT NULL,
+  `password` varchar(128) NOT NULL,
   `salt` binary(32) NOT NULL,
   `email` varchar(254) NOT NULL,
   `age` int NOT NULL,
   `teacher` tinyint DEFAULT NULL,
-  PRIMARY KEY (`user_id`)
+  `kdf_algorithm` varchar(16) NOT NULL DEFAULT 'sha256',
+  `kdf_iterations` int NOT NULL DEFAULT '10000',
+  PRIMARY KEY (`user_id`),
+  UNIQUE KEY `uq_users_info_email` (`email`),
+  UNIQUE KEY `uq_users_info_username` (`username`)
 ) ENGINE=InnoDB AUTO_INCREMENT=25 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -0,0 +1,173 @@
+# In-memory indexes over the question banks (level_test and tests_questions).
+import random
+import threading
+import time
+from collections import namedtuple
+
+# Table holding each question bank. "levels" is the placement test, "tests" every chapter test.
+BANK_TABLES = {"levels": "level_test", "tests": "tests_questions"}
+
+# Single answer key, for a question added after the bank was loaded. Format with table=.
+ANSWER_KEY_QUERY = "SELECT right_answer, chapter_name, subchapter FROM {table} WHERE test_id = %s"
+QUESTION_IDS_QUERY = "SELECT test_name, test_id FROM tests_questions ORDER BY test_id"
+
+# Pre-normalized right answer plus the chapter/subchapter used in the feedback message.
+AnswerKey = namedtuple("AnswerKey", ["answer", "chapter_name", "subchapter"])
+
+
+def normalize_answer(answer: str) -> str:
+    """Normalizes an answer the same way for stored keys and user input."""
+    return answer.strip().lower()
+
+
+def bank_for(test: str) -> str:
+    """Maps the `test` request parameter to the question bank it draws from."""
+    return "levels" if test == "levels" else "tests"
+
+
+def questions_query(count: int) -> str:
+    """Fetches the `count` served chapter test questions by id; row[8] is the id."""
+    placeholders = ", ".join(["%s"] * count)
+    return (
+        "SELECT question_type, question, multiple1, multiple2, multiple3, multiple4, chapter_name, subchapter, test_id "
+        f"FROM tests_questions WHERE test_id IN ({placeholders})"
+    )
+
+
+class AnswerKeyIndex:
+    """
+    Answer keys for every question, keyed by (bank, test_id), so grading an answer is a
+    dict lookup. Both banks are loaded on first use and reloaded after `ttl` seconds.
+    Questions inserted by another worker are picked up by a single-row lookup on a miss.
+    """
+
+    def __init__(self, pool, ttl=3600):
+        self._pool = pool
+        self.ttl = ttl
+        self._keys = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self._keys is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        keys = {}
+        with self._pool.connect() as connection:
+            with connection.cursor() as cursor:
+                for bank, table in BANK_TABLES.items():
+                    cursor.execute(
+                        f"SELECT test_id, right_answer, chapter_name, subchapter FROM {table}"
+                    )
+                    for test_id, right_answer, chapter_name, subchapter in cursor.fetchall():
+                        keys[(bank, test_id)] = AnswerKey(
+                            normalize_answer(right_answer), chapter_name, subchapter
+                        )
+        return keys
+
+    def _ensure_loaded(self):
+        if not self._expired():
+            return self._keys
+        with self._lock:
+            if self._expired():
+                self._keys = self._load()
+                self._loaded_at = time.monotonic()
+            return self._keys
+
+    def _fetch_one(self, bank, test_id):
+        with self._pool.connect() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(ANSWER_KEY_QUERY.format(table=BANK_TABLES[bank]), (test_id,))
+                return cursor.fetchone()
+
+    def load(self):
+        """Loads both banks now, e.g. while warming up, instead of on the first lookup."""
+        self._ensure_loaded()
+
+    def get(self, bank: str, test_id):
+        """Returns the AnswerKey for a question, or None if it does not exist."""
+        try:
+            test_id = int(test_id)
+        except (TypeError, ValueError):
+            return None
+
+        key = self._ensure_loaded().get((bank, test_id))
+        if key is None:
+            row = self._fetch_one(bank, test_id)
+            if row:
+                key = self.add(bank, test_id, *row)
+        return key
+
+    def add(self, bank: str, test_id: int, right_answer: str, chapter_name: str, subchapter: str):
+        """Adds or replaces a single question's key, e.g. right after it was inserted."""
+        key = AnswerKey(normalize_answer(right_answer), chapter_name, subchapter)
+        keys = self._keys
+        if keys is not None:
+            keys[(bank, int(test_id))] = key
+        return key
+
+    def invalidate(self):
+        """Drops every key so the next lookup reloads both banks."""
+        self._keys = None
+
+
+class QuestionIndex:
+    """
+    Ids of the questions in every chapter test, so a test page samples k ids and fetches
+    only those rows instead of the whole bank. Loaded on first use and reloaded after
+    `ttl` seconds, which also picks up questions inserted by other workers.
+    """
+
+    def __init__(self, pool, ttl=3600):
+        self._pool = pool
+        self.ttl = ttl
+        self._ids = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self._ids is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        ids = {}
+        with self._pool.connect() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(QUESTION_IDS_QUERY)
+                for test_name, test_id in cursor.fetchall():
+                    ids.setdefault(test_name, []).append(test_id)
+        return ids
+
+    def _ensure_loaded(self):
+        if not self._expired():
+            return self._ids
+        with self._lock:
+            if self._expired():
+                self._ids = self._load()
+                self._loaded_at = time.monotonic()
+            return self._ids
+
+    def load(self):
+        """Loads the index now, e.g. while warming up, instead of on the first lookup."""
+        self._ensure_loaded()
+
+    def ids(self, test_name: str) -> tuple:
+        """Returns the ids of every question in a test."""
+        return tuple(self._ensure_loaded().get(test_name, ()))
+
+    def sample(self, test_name: str, k: int) -> list:
+        """
+        Picks k distinct question ids of a test at random.
+        Raises ValueError, like random.sample, when the test has fewer than k questions.
+        """
+        # Sample straight from the stored list: copying it would make this O(bank size) again.
+        return random.sample(self._ensure_loaded().get(test_name, []), k)
+
+    def add(self, test_name: str, test_id: int):
+        """Registers a newly inserted question."""
+        with self._lock:
+            if self._ids is not None:
+                self._ids.setdefault(test_name, []).append(int(test_id))
+
+    def invalidate(self):
+        """Drops the index so the next lookup reloads it."""
+        self._ids = None
@@ -0,0 +1,164 @@
+# Bulk import of chapter test questions from CSV or JSON files.
+import csv
+import io
+import json
+from collections import namedtuple
+
+# Columns of an import file, in tests_questions insert order. "type" is accepted for
+# question_type so a file can use the same field names as the /questions form.
+IMPORT_COLUMNS = [
+    "question",
+    "test_name",
+    "chapter_name",
+    "subchapter",
+    "question_type",
+    "multiple1",
+    "multiple2",
+    "multiple3",
+    "multiple4",
+    "right_answer",
+]
+REQUIRED_COLUMNS = ["question", "test_name", "chapter_name", "subchapter", "question_type", "right_answer"]
+CHOICE_COLUMNS = ["multiple1", "multiple2", "multiple3", "multiple4"]
+
+# Column sizes of tests_questions, so an oversized value is reported instead of truncated.
+MAX_LENGTHS = {
+    "question": 300,
+    "test_name": 100,
+    "chapter_name": 45,
+    "subchapter": 100,
+    "question_type": 20,
+    "multiple1": 100,
+    "multiple2": 100,
+    "multiple3": 100,
+    "multiple4": 100,
+    "right_answer": 100,
+}
+
+QUESTION_TYPES = {"mul", "rw", "gap"}
+RIGHT_WRONG_ANSWERS = {"right", "wrong"}
+
+INSERT_QUESTION = (
+    "INSERT INTO tests_questions (question, test_name, chapter_name, subchapter, question_type, "
+    "multiple1, multiple2, multiple3, multiple4, right_answer) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+class ImportFormatError(Exception):
+    """Raised when an import file cannot be parsed at all."""
+
+
+# Outcome of an import. errors is a list of (row number, message); nothing is written if
+# there is any error. imported counts the rows written, or that would be on a dry run.
+ImportReport = namedtuple("ImportReport", ["imported", "errors", "dry_run"])
+
+
+def parse_rows(data: bytes, file_format: str) -> list:
+    """
+    Parses an import file into a list of dicts.
+    CSV files need a header row; JSON files hold a list of objects.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFormatError("The file must be UTF-8 encoded.")
+
+    if file_format == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise ImportFormatError("The CSV file has no header row.")
+        return list(reader)
+
+    if file_format == "json":
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise ImportFormatError(f"Invalid JSON: {e}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ImportFormatError("The JSON file must hold a list of question objects.")
+        return rows
+
+    raise ImportFormatError("Unsupported format. Use csv or json.")
+
+
+def format_for(filename: str) -> str:
+    """Guesses the import format from a file name."""
+    return "json" if filename.lower().endswith(".json") else "csv"
+
+
+def clean_row(row: dict) -> dict:
+    """Maps a raw row onto IMPORT_COLUMNS, stripping values and turning blanks into ''."""
+    if "question_type" not in row and "type" in row:
+        row = dict(row, question_type=row["type"])
+    cleaned = {}
+    for column in IMPORT_COLUMNS:
+        value = row.get(column)
+        cleaned[column] = "" if value is None else str(value).strip()
+    return cleaned
+
+
+def validate_row(row: dict, catalog_snapshot) -> list:
+    """Returns the problems with one cleaned row, or an empty list if it can be imported."""
+    errors = [f"{column} is required" for column in REQUIRED_COLUMNS if not row[column]]
+    errors += [
+        f"{column} is longer than {length} characters"
+        for column, length in MAX_LENGTHS.items()
+        if len(row[column]) > length
+    ]
+
+    if row["test_name"] and row["test_name"] not in catalog_snapshot.test_ids:
+        errors.append(f"unknown test {row['test_name']!r}")
+    if row["chapter_name"] and row["chapter_name"] not in catalog_snapshot.chapter_ids:
+        errors.append(f"unknown chapter {row['chapter_name']!r}")
+
+    question_type = row["question_type"]
+    if question_type and question_type not in QUESTION_TYPES:
+        errors.append(f"question_type must be one of {', '.join(sorted(QUESTION_TYPES))}")
+    elif question_type == "mul":
+        choices = [row[column] for column in CHOICE_COLUMNS if row[column]]
+        if len(choices) < 2:
+            errors.append("multiple choice questions need at least two answers")
+        elif row["right_answer"] and row["right_answer"] not in choices:
+            errors.append("right_answer must be one of the multiple choice answers")
+    elif question_type == "rw" and row["right_answer"] and row["right_answer"] not in RIGHT_WRONG_ANSWERS:
+        errors.append("right_answer must be right or wrong")
+    return errors
+
+
+def validate_rows(rows: list, catalog_snapshot):
+    """
+    Validates every row and returns (insert parameter tuples, errors).
+    Rows are numbered from 1, not counting a CSV header.
+    """
+    params = []
+    errors = []
+    for number, raw in enumerate(rows, 1):
+        row = clean_row(raw)
+        problems = validate_row(row, catalog_snapshot)
+        if problems:
+            errors.extend((number, problem) for problem in problems)
+        else:
+            params.append(tuple(row[column] for column in IMPORT_COLUMNS))
+    return params, errors
+
+
+def import_questions(connection, rows: list, catalog_snapshot, dry_run=False, batch_size=500):
+    """
+    Validates and inserts questions. The rows are written with batched executemany calls
+    (each one a multi-row INSERT) in a single transaction, and only if every row is valid,
+    so a file can be fixed and imported again without creating duplicates.
+    """
+    params, errors = validate_rows(rows, catalog_snapshot)
+    if errors or dry_run or not params:
+        return ImportReport(0 if errors else len(params), errors, dry_run)
+
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, len(params), batch_size):
+                cursor.executemany(INSERT_QUESTION, params[start : start + batch_size])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return ImportReport(len(params), errors, dry_run)
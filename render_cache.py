@@ -0,0 +1,62 @@
+# In-memory cache of rendered templates whose output does not depend on the user.
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+# Rendered output and its strong ETag (a digest of the body).
+Rendered = namedtuple("Rendered", ["body", "etag"])
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered templates, keyed by any hashable value. A template is
+    rendered once per key and process; the entries only go stale when the templates
+    change, i.e. on deploy, so there is no TTL.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        """Returns the Rendered entry for key, calling render() to produce the text on a miss."""
+        with self._lock:
+            rendered = self._entries.get(key)
+            if rendered is not None:
+                self._entries.move_to_end(key)
+                return rendered
+
+        # Render outside the lock; two threads missing the same key just render it twice.
+        body = render().encode()
+        rendered = Rendered(body, hashlib.sha256(body).hexdigest()[:32])
+
+        with self._lock:
+            self._entries[key] = rendered
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def source_digest(*paths) -> str:
+    """
+    Digest of every file under the given directories (missing ones are skipped). It is the
+    same in every worker running the same templates and assets, so it can be part of
+    validators that must survive a deploy only if the pages did not change.
+    """
+    digest = hashlib.sha256()
+    for root in paths:
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()[:16]
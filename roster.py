@@ -0,0 +1,187 @@
+# Keyset-paginated queries behind the teachers' /students roster, and the results export.
+import base64
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+import pymysql
+
+# Sortable roster columns: request value -> indexed column used for ordering and the keyset.
+SORT_COLUMNS = {
+    "username": "users_info.username",
+    "average": "student_stats.average_score",
+    "tests": "student_stats.tests_passed",
+}
+
+
+def encode_cursor(sort_value, user_id) -> str:
+    """Encodes the position after the last row of a page as an opaque URL-safe token."""
+    if not isinstance(sort_value, (str, int)):
+        sort_value = str(sort_value)  # Decimal averages round-trip exactly through str.
+    raw = json.dumps([sort_value, user_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str):
+    """
+    Decodes a cursor token into (sort_value, user_id), with the sort value converted back to
+    the column's type so the keyset comparison stays index-friendly. Returns None if invalid.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort_value, user_id = json.loads(raw)
+        if sort == "average":
+            sort_value = Decimal(sort_value)
+        elif sort == "tests":
+            sort_value = int(sort_value)
+        else:
+            sort_value = str(sort_value)
+        return sort_value, int(user_id)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def escape_like(prefix: str) -> str:
+    """Escapes LIKE wildcards so a search prefix is matched literally."""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+VERSION_QUERY = "SELECT MAX(last_activity) FROM student_stats"
+
+
+def page_query(sort="username", descending=False, prefix="", after=None, size=50):
+    """
+    Returns the (sql, params) of one roster page, fetching one row more than `size`.
+    The rows are (user_id, username, email, score_sum, score_count, tests_passed, sort_value).
+    """
+    column = SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+
+    conditions = ["users_info.teacher IS NULL"]
+    params = []
+    if prefix:
+        pattern = escape_like(prefix) + "%"
+        conditions.append("(users_info.username LIKE %s OR users_info.email LIKE %s)")
+        params.extend([pattern, pattern])
+    if after is not None:
+        sort_value, user_id = after
+        conditions.append(
+            f"({column} {comparison} %s OR ({column} = %s AND users_info.user_id {comparison} %s))"
+        )
+        params.extend([sort_value, sort_value, user_id])
+
+    sql = (
+        "SELECT users_info.user_id, users_info.username, users_info.email, "
+        "student_stats.score_sum, student_stats.score_count, student_stats.tests_passed, "
+        f"{column} "
+        "FROM student_stats "
+        "INNER JOIN users_info ON users_info.user_id = student_stats.user_id "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {column} {direction}, users_info.user_id {direction} "
+        "LIMIT %s"
+    )
+    return sql, params + [size + 1]
+
+
+def fetch_page(cursor, sort="username", descending=False, prefix="", after=None, size=50):
+    """
+    Fetches one page of students as rows of
+    (user_id, username, email, score_sum, score_count, tests_passed, sort_value).
+
+    Each page is a range scan on the sort column's index starting after `after`
+    (a (sort_value, user_id) pair from the previous page). Returns the rows and the
+    cursor token of the next page, or None on the last page.
+    """
+    cursor.execute(*page_query(sort, descending, prefix, after, size))
+    rows = cursor.fetchall()
+
+    # One extra row tells us whether there is a next page without a COUNT query
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1][6], rows[-1][0])
+    return rows, next_cursor
+
+
+def roster_version(cursor):
+    """
+    Returns the time of the latest change to any student's results or signup, read from the
+    last_activity index, as a cheap version of the whole roster.
+    """
+    cursor.execute(VERSION_QUERY)
+    return cursor.fetchone()[0]
+
+
+def scores_query(count: int) -> str:
+    """Test scores of `count` students, by user id."""
+    placeholders = ", ".join(["%s"] * count)
+    return f"SELECT user_id, test_name, score FROM tests_users_info WHERE user_id IN ({placeholders})"
+
+
+def fetch_scores(cursor, user_ids) -> dict:
+    """Returns {user_id: {test_name: score}} for the given students."""
+    scores = {}
+    if not user_ids:
+        return scores
+    cursor.execute(scores_query(len(user_ids)), list(user_ids))
+    for user_id, test_name, score in cursor.fetchall():
+        scores.setdefault(user_id, {})[test_name] = score
+    return scores
+
+
+# Columns of the results export, one row per (student, test).
+EXPORT_COLUMNS = ["user_id", "username", "email", "test_id", "test_name", "score"]
+
+
+def stream_results(connection, batch_size=500):
+    """
+    Yields every student's per-test result as tuples in EXPORT_COLUMNS order, read through an
+    unbuffered server-side cursor so memory stays flat however many rows there are.
+    The connection is returned to the pool when the generator finishes or is closed.
+    """
+    try:
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            # Ordering by the primary key prefix lets MySQL stream rows without a filesort
+            cursor.execute(
+                "SELECT users_info.user_id, users_info.username, users_info.email, "
+                "tests.id, tests.test_name, tests_users_info.score "
+                "FROM tests_users_info "
+                "INNER JOIN users_info ON users_info.user_id = tests_users_info.user_id "
+                "INNER JOIN tests ON tests.test_name = tests_users_info.test_name "
+                "WHERE users_info.teacher IS NULL "
+                "ORDER BY tests_users_info.user_id"
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+    finally:
+        connection.close()
+
+
+def csv_chunks(rows, batch_size=500):
+    """Formats result rows as CSV text, yielding one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows, batch_size=500):
+    """Formats result rows as newline-delimited JSON objects, one chunk per batch of rows."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
+        if len(lines) == batch_size:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
@@ -0,0 +1,139 @@
+# Log of SQL statements slower than a threshold, with the EXPLAIN plan of each one.
+#
+# Entries are JSON lines appended to SLOW_QUERY_LOG:
+#   {"type": "slow", "time", "worker", "route", "statement", "params", "elapsed_ms"}
+#   {"type": "explain", "time", "worker", "statement", "plan"}  (or "error")
+# Parameters are logged by type only, never by value. The plan is captured the first time
+# a statement is seen to be slow in a worker process.
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_request_context, request
+
+# Statements MySQL can EXPLAIN.
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+# Repeated placeholder groups, so "IN (%s, %s)" and "IN (%s, %s, %s)" are the same statement.
+REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+REPEATED_PLACEHOLDER = re.compile(r"%s(?:\s*,\s*%s)+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(sql: str) -> str:
+    """The statement with whitespace and repeated placeholders collapsed, used as its key."""
+    sql = WHITESPACE.sub(" ", sql.strip())
+    sql = REPEATED_GROUP.sub(r"\1, ...", sql)
+    return REPEATED_PLACEHOLDER.sub("%s, ...", sql)
+
+
+def param_shape(args):
+    """The types of the bound parameters; executemany batches become their row count and shape."""
+    if args is None:
+        return None
+    if isinstance(args, dict):
+        return {key: type(value).__name__ for key, value in args.items()}
+    if isinstance(args, (list, tuple)):
+        if args and isinstance(args[0], (list, tuple, dict)):
+            return {"rows": len(args), "row": param_shape(args[0])}
+        return [type(value).__name__ for value in args]
+    return type(args).__name__
+
+
+class SlowQueryLog:
+    """
+    Query listener for a ConnectionPool. Statements slower than SLOW_QUERY_MS are written
+    to the log with the route that ran them; the first time a statement is slow its EXPLAIN
+    plan is captured on a separate pooled connection, on a background thread, so the
+    request that ran it is not delayed.
+
+    App config: SLOW_QUERY_MS (0 disables the log) and SLOW_QUERY_LOG (file path).
+    """
+
+    def __init__(self, app=None, pool=None):
+        self.pool = None
+        self.threshold = 0
+        self.path = None
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        if app is not None:
+            self.init_app(app, pool)
+
+    def init_app(self, app, pool):
+        app.config.setdefault("SLOW_QUERY_MS", 200)
+        app.config.setdefault("SLOW_QUERY_LOG", os.path.join(app.instance_path, "slow-queries.jsonl"))
+        self.pool = pool
+        self.threshold = app.config["SLOW_QUERY_MS"] / 1000
+        self.path = app.config["SLOW_QUERY_LOG"]
+        if self.threshold > 0:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            pool.query_listeners.append(self.record_query)
+
+    def record_query(self, sql, args, elapsed, rowcount):
+        # The EXPLAINs run on pooled connections too; don't log or explain those.
+        if elapsed < self.threshold or getattr(self._local, "explaining", False):
+            return
+
+        statement = normalize(sql)
+        route = request.endpoint if has_request_context() else None
+        self._write(
+            {
+                "type": "slow",
+                "route": route,
+                "statement": statement,
+                "params": param_shape(args),
+                "elapsed_ms": round(elapsed * 1000, 3),
+            }
+        )
+
+        with self._lock:
+            first = statement not in self._seen
+            self._seen.add(statement)
+        verb = statement.split(" ", 1)[0].upper()
+        if first and verb in EXPLAINABLE:
+            # executemany batches are explained with their first row
+            if isinstance(args, (list, tuple)) and args and isinstance(args[0], (list, tuple, dict)):
+                args = args[0]
+            self._background().submit(self._explain, sql, args, statement)
+
+    def _background(self):
+        # Created per process: a forked worker cannot use the thread of its parent.
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _explain(self, sql, args, statement):
+        self._local.explaining = True
+        try:
+            connection = self.pool.connect()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN " + sql, args)
+                    columns = [column[0] for column in cursor.description]
+                    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                connection.rollback()
+            finally:
+                connection.close()
+            self._write({"type": "explain", "statement": statement, "plan": plan})
+        except Exception as e:
+            print(f"Error explaining slow query: {e}")
+            self._write({"type": "explain", "statement": statement, "error": str(e)})
+        finally:
+            self._local.explaining = False
+
+    def _write(self, entry: dict):
+        entry = dict(entry, time=time.strftime("%Y-%m-%dT%H:%M:%S"), worker=os.getpid())
+        line = json.dumps(entry, default=str) + "\n"
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as e:
+            print(f"Error writing the slow query log: {e}")
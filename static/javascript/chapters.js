@@ -44,7 +44,7 @@ $(document).ready(function () {
             $(this).parent().parent().siblings('.rest').children('.col-12').children('.text').slideUp();
         } else {
             $(this).addClass('rotate');
-            $(this).parent().parent().siblings('.rest').children('.col-12').children('.text').slideDown();
+            showText($(this).parent().parent().siblings('.rest').children('.col-12').children('.text'));
            
         }
 
@@ -52,6 +52,42 @@ $(document).ready(function () {
 
 });
 
+// Chapter bodies are fetched the first time they are opened
+var contentRequests = {};
+
+function loadContent($text) {
+    var $content = $text.children('.chapter-content');
+    var chapter = $content.data('chapter');
+    if ($content.length == 0 || $content.data('loaded')) {
+        return $.Deferred().resolve().promise();
+    }
+    if (!contentRequests[chapter]) {
+        contentRequests[chapter] = $.ajax({
+            type: 'GET',
+            url: '/chapters/' + chapter + '/content',
+            data: { v: content_versions[chapter] },
+            dataType: 'html'
+        })
+            .done(function (html) {
+                $content.html(html).data('loaded', true);
+                Prism.highlightAllUnder($content[0]);
+                $content.find('pre code').each(function () {
+                    hljs.highlightElement(this);
+                });
+            })
+            .fail(function () {
+                delete contentRequests[chapter];
+            });
+    }
+    return contentRequests[chapter];
+}
+
+function showText($text) {
+    loadContent($text).always(function () {
+        $text.slideDown();
+    });
+}
+
 $(".right").hover(function () {
     $(this).css('cursor', 'pointer');
 });
@@ -64,7 +100,7 @@ $(".inner-li").click(function () {
     $('.sidebar').removeClass("show");
     $('.image2').removeClass("rotate");
     if (!($('#' + $(this).children('.inner-a').text().replace(/ /g, '')).children().eq(0).hasClass('disabled'))) {
-        move.parent().parent().siblings('.rest').children('.col-12').children('.text').slideDown();
+        showText(move.parent().parent().siblings('.rest').children('.col-12').children('.text'));
         move.addClass('rotate');
 
     } else {
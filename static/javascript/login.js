@@ -177,7 +177,8 @@ function login() {
                     $(location).prop('href', 'home')
                 }
             }
-        });
+        })
+        .fail(showRequestError);
 
 };
 
@@ -206,6 +207,16 @@ function signup() {
                 window.location.href='/home';
             }
 
-        });
+        })
+        .fail(showRequestError);
 
-};
\ No newline at end of file
+};
+
+// Shows the error of a failed request, e.g. a 503 while the server is busy hashing passwords
+function showRequestError(xhr) {
+    var response = xhr.responseJSON || {error: 'An error occurred, please try again later.'};
+    Swal.fire({
+        icon: 'error',
+        text: response.error
+    });
+}
\ No newline at end of file
@@ -198,4 +198,40 @@ $('#form').submit(function(e){
     }
     
     
-});
\ No newline at end of file
+});
+
+
+$('#import-form').submit(function(e){
+    e.preventDefault();
+    var data = new FormData(this);
+    data.set('dry_run', $('#import-dry-run').is(':checked') ? '1' : '0');
+    $.ajax({
+        type: 'POST',
+        url: '/questions/import',
+        data: data,
+        processData: false,
+        contentType: false,
+        success: function (response) {
+            Swal.fire({
+                icon: 'success',
+                text: response.success
+            });
+        },
+        error: function (xhr) {
+            var response = xhr.responseJSON || {error: 'An error occurred while importing the questions.'};
+            var lines = [response.error];
+            if (response.errors) {
+                // Show the first problems; the rest are usually more of the same
+                response.errors.slice(0, 10).forEach(function (error) {
+                    lines.push('Row ' + error.row + ': ' + error.message);
+                });
+            }
+            Swal.fire({
+                icon: 'error',
+                html: lines.map(function (line) {
+                    return $('<div>').text(line).html();
+                }).join('<br>')
+            });
+        }
+    });
+});
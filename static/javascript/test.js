@@ -101,68 +101,78 @@ $('input[type=radio]').click(function () {
                 }
             });
     } else {
-        $.ajax({
-            data: {
-                question: question,
-                answer: answer,
-                test: searchParams.get('test')
-            },
-            type: 'POST',
-            url: '/rightanswer'
-        })
-            .done(function (data) {
-                $radio.siblings('input[type=radio]').each(function (index) {
-                    $(this).attr("disabled", true);
-
-                });
-
-                if (data.error) {
-                    Swal.fire({
-                        icon: 'error',
-                        text: data.error
-                    });
-                } else if (data.success) {
-                    $answer_p.addClass('right')
-                    $answer_p.text(data.success)
-                }
-                else if (data.false) {
-                    $answer_p.addClass('wrong')
-                    $answer_p.text(data.false)
+        // Final and level tests are graded all at once on submit, so only lock the answer here
+        $radio.siblings('input[type=radio]').each(function (index) {
+            $(this).attr("disabled", true);
 
-                }
-            });
+        });
     }
 });
 
 
 
+// Collects the answer of every question on the page, keyed by question id
+function collectAnswers() {
+    var answers = {};
+    $('h5 > span').each(function () {
+        var $question = $(this).closest('.center');
+        var $checked = $question.find('input[type=radio]:checked');
+        if ($checked.length) {
+            answers[$(this).text()] = $checked.val();
+        } else if ($question.find('input[type=text]').length) {
+            answers[$(this).text()] = $question.find('input[type=text]').val();
+        }
+    });
+    return answers;
+}
+
+
+// Shows the feedback returned by the server under each question
+function showResults(results) {
+    $.each(results, function (index, result) {
+        $('h5 > span').filter(function () {
+            return $(this).text() == String(result.question);
+        }).each(function () {
+            $(this).closest('.center').children('p')
+                .removeClass('invisible right wrong')
+                .addClass(result.correct ? 'right' : 'wrong')
+                .text(result.feedback);
+        });
+    });
+}
+
+
+// Sends every answer in one request; the server grades the test and records the score
+function gradeTest() {
+    return $.ajax({
+        data: JSON.stringify({ test: get('test'), answers: collectAnswers() }),
+        contentType: 'application/json',
+        type: 'POST',
+        url: '/gradetest'
+    });
+}
+
+
+function showOutcome(data, redirect) {
+    var icon = data.error ? 'error' : (data.success ? 'success' : 'info');
+    Swal.fire({
+        icon: icon,
+        text: data.error || data.success || data.info
+    }).then(function () {
+        if (redirect) {
+            window.location = "chapters";
+        }
+    });
+}
+
+
 $('#submit').click(function () {
     if (get('test').slice(0, 1) == 'C' || get('test').slice(0, 1) == 'Q') {
 
         if ($("p.invisible").length == 0) {
-            score = (($("p.right").length / ($("p.right").length + $("p.wrong").length)) * 100).toFixed(2)
-            $.ajax({
-                data: { score: score, test: get('test') },
-                type: 'POST',
-                url: '/submitanswer'
-            })
-                .done(function (data) {
-                    if (data.error) {
-                        Swal.fire({
-                            icon: 'error',
-                            text: data.error
-                        }).then(function () {
-                            window.location = "chapters";
-                        });
-                    } else if (data.success) {
-                        Swal.fire({
-                            icon: 'success',
-                            text: data.success
-                        }).then(function () {
-                            window.location = "chapters";
-                        });
-                    }
-                });
+            gradeTest().done(function (data) {
+                showOutcome(data, true);
+            });
         } else {
             Swal.fire({
                 icon: 'error',
@@ -170,47 +180,21 @@ $('#submit').click(function () {
             });
         }
     } else {
-
-
-
-        $('input[id^="gap"]').each(function (index) {
-            let searchParams = new URLSearchParams(window.location.search)
-            if ($(this).val() == "") {
-                Swal.fire({
-                    icon: 'info',
-                    text: 'Enter your answers!'
-                });
-            } else {
-                question = $(this).parent().siblings('h5').children('span').text();
-                answer = $(this).val();
-                var $answer_p = $(this).parent().siblings('p')
-                $.ajax({
-                    data: {
-                        question: question,
-                        answer: answer,
-                        test: searchParams.get('test')
-                    },
-                    type: 'POST',
-                    url: '/rightanswer'
-                })
-                    .done(function (data) {
-                        if (data.error) {
-                            Swal.fire({
-                                icon: 'error',
-                                text: data.error
-                            });
-                        } else if (data.success) {
-                            $answer_p.addClass('right')
-                            $answer_p.text(data.success)
-                        }
-                        else if (data.false) {
-                            $answer_p.addClass('wrong')
-                            $answer_p.text(data.false)
-
-                        }
-                    });
-            }
-        });
+        var answers = collectAnswers();
+        if (Object.keys(answers).length != $('h5 > span').length) {
+            Swal.fire({
+                icon: 'error',
+                text: 'You have to complete all the questions!'
+            });
+            return;
+        }
+        if ($.grep($.map(answers, function (answer) { return answer; }), function (answer) { return answer == ""; }).length) {
+            Swal.fire({
+                icon: 'info',
+                text: 'Enter your answers!'
+            });
+            return;
+        }
         Swal.fire({
             icon: 'info',
             text: 'Are you sure you want to submit?',
@@ -219,70 +203,17 @@ $('#submit').click(function () {
             denyButtonText: `Nope!`,
         }).then((result) => {
             if (result.isConfirmed) {
-                if ($("p.right").length + $("p.wrong").length == 6 || $("p.right").length + $("p.wrong").length == 10) {
-                    score = (($("p.right").length / ($("p.right").length + $("p.wrong").length)) * 100).toFixed(2)
-                    $.ajax({
-                        data: { score: score, test: get('test') },
-                        type: 'POST',
-                        url: '/submitanswer'
-                    })
-                        .done(function (data) {
-                            let searchParams = new URLSearchParams(window.location.search)
-                            if (searchParams.get('test') == 'levels') {
-                                if (data.error) {
-                                    Swal.fire({
-                                        icon: 'error',
-                                        text: data.error
-                                    }).then(function () {
-                                        window.location = "chapters";
-                                    });
-                                } else if (data.success) {
-                                    Swal.fire({
-                                        icon: 'success',
-                                        text: data.success
-                                    }).then(function () {
-                                        window.location = "chapters";
-                                    });
-                                } else if (data.info) {
-                                    Swal.fire({
-                                        icon: 'info',
-                                        text: data.info
-                                    }).then(function () {
-                                        window.location = "chapters";
-                                    });
-                                }
-                            } else {
-                                $("p.right").removeClass('invisible')
-                                $("p.wrong").removeClass('invisible')
-                                if (data.error) {
-                                    Swal.fire({
-                                        icon: 'error',
-                                        text: data.error
-                                    })
-                                } else if (data.success) {
-                                    Swal.fire({
-                                        icon: 'success',
-                                        text: data.success,
-                                    })
-                                } else if (data.info) {
-                                    Swal.fire({
-                                        icon: 'info',
-                                        text: data.info
-                                    })
-                                }
-                            }
-                        });
-                } else {
-                    Swal.fire({
-                        icon: 'error',
-                        text: 'You have to complete all the questions!'
-                    });
-                }
+                gradeTest().done(function (data) {
+                    if (get('test') == 'levels') {
+                        showOutcome(data, true);
+                    } else {
+                        if (data.results) {
+                            showResults(data.results);
+                        }
+                        showOutcome(data, false);
+                    }
+                });
             }
         });
-
-
     }
 });
-
-
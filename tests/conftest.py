@@ -0,0 +1,84 @@
+# Fixtures shared by the test suite.
+#
+# By default the app runs against an in-process SQLite stand-in for MySQL, created from
+# pythonista.sql for each test session. Set TEST_MYSQL_DATABASE to the name of a local
+# MySQL database loaded from pythonista.sql (DB_USERNAME / DB_PASSWORD as for the app)
+# to run the same tests against MySQL; they only add uniquely named accounts to it.
+import os
+import uuid
+from functools import partial
+
+import pytest
+
+import main
+import mysql_standin
+
+DUMP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pythonista.sql")
+
+
+class QueryLog:
+    """Pool query listener recording every statement run while it is registered."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, sql, args, elapsed, rowcount):
+        self.statements.append(sql)
+
+    def clear(self):
+        self.statements = []
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    if os.getenv("TEST_MYSQL_DATABASE"):
+        main.app.config["MYSQL_DATABASE_DB"] = os.getenv("TEST_MYSQL_DATABASE")
+    else:
+        path = str(tmp_path_factory.mktemp("database") / "pythonista.sqlite3")
+        mysql_standin.create_database(path, DUMP_PATH)
+        main.db_pool._connect = partial(mysql_standin.connect, path)
+
+    main.app.config.update(TESTING=True, SECRET_KEY=main.app.config["SECRET_KEY"] or "test")
+    # Hashing strength is not under test
+    main.password_hasher.iterations = 1000
+    main.warm_up()
+    yield main.app
+    main.db_pool.close()
+
+
+@pytest.fixture
+def queries(app):
+    """The statements run on the connection pool during the test."""
+    log = QueryLog()
+    main.db_pool.query_listeners.append(log)
+    yield log
+    main.db_pool.query_listeners.remove(log)
+
+
+def sign_up(app, teacher=False):
+    """Creates a uniquely named account and returns a test client logged in to it."""
+    name = "test" + uuid.uuid4().hex[:12]
+    email = f"{name}@example.com"
+    client = app.test_client()
+    response = client.post("/signup", data={"username": name, "email": email, "password": "pw", "age": "30"})
+    assert response.status_code == 200
+
+    if teacher:
+        with main.db_pool.connect() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE users_info SET teacher = 1 WHERE username = %s", (name,))
+            connection.commit()
+
+    response = client.post("/login", data={"email": email, "password": "pw"})
+    assert response.status_code == 200
+    return client
+
+
+@pytest.fixture
+def student(app):
+    return sign_up(app)
+
+
+@pytest.fixture
+def teacher(app):
+    return sign_up(app, teacher=True)
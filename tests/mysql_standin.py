@@ -0,0 +1,231 @@
+# In-process stand-in for the MySQL server, so the test suite needs no external services.
+#
+# The database is an SQLite file created from pythonista.sql, and connections mimic the
+# parts of PyMySQL the app uses: tuple rows, buffered cursors, rowcount, lastrowid,
+# commit/rollback and server_status. Statements are translated from the MySQL dialect
+# the app writes (%s placeholders, NOW(6), GREATEST, IF, INSERT IGNORE,
+# ON DUPLICATE KEY UPDATE, LIKE with backslash escapes) to SQLite.
+#
+# It exists to count and exercise statements, not to model MySQL: comparisons are
+# case-sensitive, there are no information_schema tables (so no migrations) and the
+# query plans are SQLite's.
+import datetime
+import decimal
+import re
+import sqlite3
+
+from pymysql.constants import SERVER_STATUS
+
+sqlite3.register_adapter(decimal.Decimal, float)
+sqlite3.register_converter("datetime", lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("decimal", lambda value: decimal.Decimal(value.decode()))
+
+# pythonista.sql lines that are MySQL session settings, locks or comments.
+SKIPPED_LINES = ("--", "/*!", "LOCK TABLES", "UNLOCK TABLES")
+
+MYSQL_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "0": "\0", "Z": "\x1a"}
+
+PLACEHOLDER = re.compile(r"%s")
+NOW_PRECISE = re.compile(r"\bNOW\(6\)", re.IGNORECASE)
+NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+GREATEST = re.compile(r"\bGREATEST\(", re.IGNORECASE)
+LEAST = re.compile(r"\bLEAST\(", re.IGNORECASE)
+IF = re.compile(r"\bIF\(", re.IGNORECASE)
+INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE)
+ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+VALUES_FUNCTION = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+LIKE_PARAMETER = re.compile(r"\bLIKE\s+\?", re.IGNORECASE)
+EXPLAIN = re.compile(r"^\s*EXPLAIN\b", re.IGNORECASE)
+
+
+def _mysql_string_to_sqlite(literal: str) -> str:
+    """Rewrites a single-quoted MySQL literal (backslash escapes) as an SQLite one."""
+    characters = []
+    position = 1
+    while position < len(literal) - 1:
+        character = literal[position]
+        if character == "\\":
+            position += 1
+            escaped = literal[position]
+            characters.append(MYSQL_ESCAPES.get(escaped, escaped))
+        else:
+            characters.append(character)
+        position += 1
+    return "'" + "".join(characters).replace("'", "''") + "'"
+
+
+def _convert_strings(sql: str) -> str:
+    return re.sub(r"'(?:[^'\\]|\\.|'')*'", lambda match: _mysql_string_to_sqlite(match.group(0)), sql)
+
+
+def _convert_create_table(lines: list) -> list:
+    """Turns a mysqldump CREATE TABLE into SQLite statements: the table and its indexes."""
+    table = re.search(r"CREATE TABLE `(\w+)`", lines[0]).group(1)
+    columns = []
+    indexes = []
+    for line in lines[1:-1]:
+        line = line.strip().rstrip(",")
+        unique = re.match(r"UNIQUE KEY `\w+` (\(.*\))", line)
+        key = re.match(r"KEY `(\w+)` (\(.*\))", line)
+        if unique:
+            columns.append(f"UNIQUE {unique.group(1)}")
+        elif key:
+            indexes.append(f"CREATE INDEX `{key.group(1)}` ON `{table}` {key.group(2)};")
+        else:
+            # AUTO_INCREMENT columns become INTEGER primary keys, i.e. SQLite rowids
+            line = re.sub(r"\bint NOT NULL AUTO_INCREMENT", "INTEGER", line)
+            if "GENERATED ALWAYS" in line:
+                line = IF.sub("iif(", line).replace(" / ", " * 1.0 / ")
+            columns.append(line)
+    return [f"CREATE TABLE `{table}` (\n  " + ",\n  ".join(columns) + "\n);"] + indexes
+
+
+def convert_dump(dump: str) -> str:
+    """Converts the mysqldump in pythonista.sql into an SQLite script."""
+    statements = []
+    create_table = None
+    for line in dump.splitlines():
+        if create_table is not None:
+            create_table.append(line)
+            if line.startswith(")"):
+                statements.extend(_convert_create_table(create_table))
+                create_table = None
+        elif line.startswith("CREATE TABLE"):
+            create_table = [line]
+        elif line.startswith("INSERT INTO"):
+            statements.append(_convert_strings(line))
+        elif line.strip() and not line.startswith(SKIPPED_LINES):
+            statements.append(line)
+    return "\n".join(statements)
+
+
+def create_database(path, dump_path):
+    """Creates an SQLite database at path with the schema and data of pythonista.sql."""
+    with open(dump_path, encoding="utf-8") as file:
+        script = convert_dump(file.read())
+    database = sqlite3.connect(path)
+    try:
+        database.executescript(script)
+        database.commit()
+    finally:
+        database.close()
+
+
+def translate(sql: str, has_args: bool) -> str:
+    """Translates one statement from the MySQL dialect the app uses to SQLite."""
+    if has_args:
+        sql = PLACEHOLDER.sub("?", sql).replace("%%", "%")
+    sql = NOW_PRECISE.sub("strftime('%Y-%m-%d %H:%M:%f', 'now')", sql)
+    sql = NOW.sub("CURRENT_TIMESTAMP", sql)
+    sql = GREATEST.sub("MAX(", sql)
+    sql = LEAST.sub("MIN(", sql)
+    sql = IF.sub("iif(", sql)
+    sql = INSERT_IGNORE.sub("INSERT OR IGNORE", sql)
+    sql = LIKE_PARAMETER.sub(r"LIKE ? ESCAPE '\\'", sql)
+    sql = EXPLAIN.sub("EXPLAIN QUERY PLAN", sql)
+    duplicate = ON_DUPLICATE.search(sql)
+    if duplicate:
+        update = VALUES_FUNCTION.sub(r"excluded.\1", sql[duplicate.end() :])
+        sql = sql[: duplicate.start()] + "ON CONFLICT DO UPDATE SET" + update
+    return sql
+
+
+class Cursor:
+    """Buffered cursor, like PyMySQL's default one: rows are fetched by execute()."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection._database.cursor()
+        self._rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+
+    def execute(self, query, args=None):
+        if args is not None and not isinstance(args, (tuple, list, dict)):
+            args = (args,)
+        self._cursor.execute(translate(query, args is not None), args or ())
+        self.description = self._cursor.description
+        if self.description is not None:
+            self._rows = self._cursor.fetchall()
+            self.rowcount = len(self._rows)
+        else:
+            self._rows = []
+            self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    def executemany(self, query, args):
+        self._cursor.executemany(translate(query, True), args)
+        self._rows = []
+        self.description = None
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return tuple(rows)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return tuple(rows)
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Connection:
+    """A PyMySQL-like connection. As with MySQL, writes stay in a transaction until commit()."""
+
+    def __init__(self, path):
+        self._database = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self.open = True
+
+    @property
+    def server_status(self):
+        return SERVER_STATUS.SERVER_STATUS_IN_TRANS if self._database.in_transaction else 0
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(self)
+
+    def begin(self):
+        self._database.commit()
+
+    def commit(self):
+        self._database.commit()
+
+    def rollback(self):
+        self._database.rollback()
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise sqlite3.ProgrammingError("Connection is closed.")
+
+    def close(self):
+        self._database.close()
+        self.open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def connect(path):
+    return Connection(path)
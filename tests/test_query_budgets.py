@@ -0,0 +1,130 @@
+# Round-trip budgets: the most statements each route may run once the caches are warm.
+#
+# A change that adds a query to a route fails here. Raise a budget only together with the
+# change that needs the extra round-trip, and say why in its commit.
+import re
+import uuid
+
+import main
+
+QUERY_BUDGETS = {
+    ("GET", "/"): 0,
+    ("POST", "/signup"): 4,
+    ("POST", "/login"): 1,
+    ("GET", "/chapters"): 1,
+    ("POST", "/chapters"): 2,
+    ("GET", "/chapters/<chapter>/content"): 0,
+    ("GET", "/tests"): 2,
+    ("POST", "/rightanswer"): 0,
+    ("POST", "/gradetest"): 4,
+    ("POST", "/leveltest"): 1,
+    ("GET", "/profile"): 1,
+    ("GET", "/python"): 0,
+    ("GET", "/admin"): 0,
+    ("GET", "/questions"): 0,
+    ("GET", "/students"): 3,
+    ("GET", "/students/export"): 1,
+}
+
+QUESTION_ID = re.compile(r'display: none;">(\d+)<')
+
+
+def route_of(method: str, url: str) -> tuple:
+    """The (method, URL rule) a request is dispatched to, e.g. ("GET", "/tests")."""
+    adapter = main.app.url_map.bind("localhost")
+    rule, _ = adapter.match(url.split("?")[0], method, return_rule=True)
+    return method, rule.rule
+
+
+def within_budget(client, queries, method: str, url: str, **kwargs):
+    """Sends a request and fails if it ran more statements than its route's budget."""
+    route = route_of(method, url)
+    queries.clear()
+    response = client.open(url, method=method, **kwargs)
+    assert response.status_code < 500, f"{method} {url} returned {response.status_code}"
+
+    budget = QUERY_BUDGETS[route]
+    statements = "\n".join(f"  {statement}" for statement in queries.statements)
+    assert len(queries.statements) <= budget, (
+        f"{method} {url} ran {len(queries.statements)} statements, "
+        f"over its budget of {budget}:\n{statements}"
+    )
+    return response
+
+
+def served_questions(response) -> list:
+    return QUESTION_ID.findall(response.get_data(as_text=True))
+
+
+def right_answers(bank: str, question_ids: list) -> dict:
+    return {question_id: main.answer_keys.get(bank, question_id).answer for question_id in question_ids}
+
+
+def test_public_pages(app, queries):
+    client = app.test_client()
+    within_budget(client, queries, "GET", "/")
+    within_budget(client, queries, "GET", "/python")
+
+
+def test_signup_and_login(app, queries):
+    client = app.test_client()
+    name = "budget" + uuid.uuid4().hex[:12]
+    data = {"username": name, "email": f"{name}@example.com", "password": "pw", "age": "30"}
+    within_budget(client, queries, "POST", "/signup", data=data)
+    within_budget(client, queries, "POST", "/login", data={"email": data["email"], "password": "pw"})
+
+
+def test_beginner_flow(student, queries):
+    within_budget(student, queries, "GET", "/chapters")
+    within_budget(student, queries, "POST", "/leveltest", data={"answer": "no"})
+    within_budget(student, queries, "GET", "/chapters")
+
+    response = within_budget(student, queries, "POST", "/chapters", data={"chapter": "Quickstart"})
+    assert "success" in response.get_json()
+    within_budget(student, queries, "GET", "/chapters/Quickstart/content")
+
+    response = within_budget(student, queries, "GET", "/tests?test=Quickstart_test")
+    questions = served_questions(response)
+    assert questions
+    answers = right_answers("tests", questions)
+    for question_id, answer in answers.items():
+        within_budget(
+            student,
+            queries,
+            "POST",
+            "/rightanswer",
+            data={"question": question_id, "answer": answer, "test": "Quickstart_test"},
+        )
+    response = within_budget(
+        student, queries, "POST", "/gradetest", json={"test": "Quickstart_test", "answers": answers}
+    )
+    assert "success" in response.get_json()
+
+    within_budget(student, queries, "GET", "/profile")
+    within_budget(student, queries, "GET", "/chapters")
+
+
+def test_level_test_flow(student, queries):
+    within_budget(student, queries, "GET", "/chapters")
+    response = within_budget(student, queries, "GET", "/tests?test=levels")
+    questions = served_questions(response)
+    assert questions
+
+    response = within_budget(
+        student,
+        queries,
+        "POST",
+        "/gradetest",
+        json={"test": "levels", "answers": right_answers("levels", questions)},
+    )
+    assert "info" in response.get_json()
+    within_budget(student, queries, "GET", "/profile")
+    within_budget(student, queries, "GET", "/chapters")
+
+
+def test_teacher_pages(teacher, student, queries):
+    within_budget(teacher, queries, "GET", "/admin")
+    within_budget(teacher, queries, "GET", "/questions")
+    within_budget(teacher, queries, "GET", "/students")
+    within_budget(teacher, queries, "GET", "/students?sort=average&order=desc&q=test")
+    within_budget(teacher, queries, "GET", "/students/export")